@@ -1,39 +1,273 @@
 import asyncio
 import logging
+import signal
+from dataclasses import asdict
+from typing import List, Optional
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from database import Database
+from database import Database, AsyncDatabase
+from utils import (AdminRoster, ChatOrderingMiddleware, DatabaseMaintenance, DeletionScheduler, OutboundQueue,
+                   RaidDetector, SlowModeLimiter, SubscriptionCache, WarningCoalescer, setup_logging)
 from controllers.group_controller import GroupController
 from controllers.admin_controller import AdminController
 
+from utils.metrics import ApiMetricsMiddleware, MetricsServer
+from sharding import ShardedFrontend, ShardMiddleware, serve_worker, shard_for
+from webhook import WebhookServer
+
 from config import config
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
-async def main():
-    try:
-        bot = Bot(token=config.BOT_TOKEN)
-        storage = MemoryStorage()
-        dp = Dispatcher(storage=storage)
+def create_bot() -> Bot:
+    session = None
+    if config.BOT_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.BOT_API_URL))
+    bot = Bot(token=config.BOT_TOKEN, session=session)
+    bot.session.middleware(ApiMetricsMiddleware())
+    return bot
+
+
+# Всё, что обрабатывает обновления в одном процессе: база, кэши, очереди и контроллеры.
+# В режиме воркеров каждый процесс обслуживает только свои чаты (shard из shards)
+class BotApplication:
+    def __init__(self, bot: Bot, shard: int = 0, shards: int = 1):
+        self.bot = bot
+        self.shard = shard
+        self.shards = shards
+        self.db: Optional[AsyncDatabase] = None
+        self.outbound: Optional[OutboundQueue] = None
+        self.maintenance: Optional[DatabaseMaintenance] = None
+        self.slow_mode = SlowModeLimiter(max_entries=config.SLOW_MODE_MAX_ENTRIES)
+        self.snapshot_path = config.SLOW_MODE_SNAPSHOT_PATH
+        if self.snapshot_path and shards > 1:
+            self.snapshot_path = f"{self.snapshot_path}.{shard}"
 
-        db = Database()
+    async def start(self) -> Dispatcher:
+        bot = self.bot
+        dp = Dispatcher(storage=MemoryStorage())
+        dp.update.outer_middleware(ChatOrderingMiddleware(
+            max_concurrency=config.DISPATCH_CONCURRENCY,
+            mode=config.DISPATCH_ORDERING
+        ))
 
-        admin_controller = AdminController(bot, db)
-        group_controller = GroupController(bot, db)
+        db = self.db = AsyncDatabase(
+            Database(config.DB_PATH),
+            max_workers=config.DB_WORKERS,
+            users_batch=config.USERS_FLUSH_BATCH,
+            users_flush_interval=config.USERS_FLUSH_INTERVAL,
+            moderation_cache_size=config.MODERATION_CACHE_SIZE
+        )
+        await db.load_groups()
+
+        if self.snapshot_path:
+            self.slow_mode.load_snapshot(self.snapshot_path)
+
+        raid = RaidDetector(
+            threshold=config.RAID_THRESHOLD,
+            window=config.RAID_WINDOW,
+            cooldown=config.RAID_COOLDOWN,
+            trusted_age=config.RAID_TRUSTED_AGE,
+            slow_mode_delay=config.RAID_SLOW_MODE_DELAY,
+            max_members=config.RAID_MAX_MEMBERS
+        )
+        # База общая для всех воркеров, обслуживает её только первый
+        if self.shard == 0:
+            day = 86400
+            self.maintenance = DatabaseMaintenance(
+                db,
+                retention={
+                    'users': config.RETENTION_USERS_DAYS * day,
+                    'user_messages': config.RETENTION_USER_MESSAGES_DAYS * day,
+                    'user_violations': config.RETENTION_USER_VIOLATIONS_DAYS * day,
+                    'violation_events': config.RETENTION_VIOLATION_EVENTS_DAYS * day,
+                },
+                interval=config.MAINTENANCE_INTERVAL,
+                batch_size=config.MAINTENANCE_BATCH_SIZE,
+                batch_pause=config.MAINTENANCE_BATCH_PAUSE,
+                vacuum_pages=config.MAINTENANCE_VACUUM_PAGES
+            )
+            self.maintenance.start()
+
+        admins = AdminRoster(bot, ttl=config.ADMIN_ROSTER_TTL)
+        admin_controller = AdminController(bot, db, raid, admins, self.maintenance)
+        subscriptions = SubscriptionCache(
+            bot,
+            positive_ttl=config.SUBSCRIPTION_POSITIVE_TTL,
+            negative_ttl=config.SUBSCRIPTION_NEGATIVE_TTL
+        )
+        # Общий лимит Bot API делится между воркерами
+        outbound = self.outbound = OutboundQueue(
+            bot,
+            global_rate=config.OUTBOUND_GLOBAL_RATE / self.shards,
+            chat_messages_per_minute=config.OUTBOUND_CHAT_MESSAGES_PER_MINUTE,
+            max_in_flight=config.OUTBOUND_MAX_IN_FLIGHT,
+            send_ttl=config.OUTBOUND_SEND_TTL,
+            deletions=DeletionScheduler(
+                save_func=db.add_pending_deletions,
+                remove_func=db.remove_pending_deletions,
+                flush_interval=config.DELETIONS_FLUSH_INTERVAL
+            )
+        )
+        pending = await db.get_pending_deletions()
+        outbound.deletions.load([row for row in pending if shard_for(row[0], self.shards) == self.shard])
+        warnings = WarningCoalescer(
+            outbound,
+            window=config.WARNING_COALESCE_WINDOW,
+            edit_interval=config.WARNING_EDIT_INTERVAL
+        )
+        group_controller = GroupController(bot, db, self.slow_mode, subscriptions, outbound, warnings, raid)
 
         admin_controller.register_handlers(dp)
         group_controller.register_handlers(dp)
+        return dp
+
+    async def stop(self):
+        if self.maintenance:
+            await self.maintenance.stop()
+        if self.outbound:
+            await self.outbound.stop()
+        if self.snapshot_path:
+            self.slow_mode.save_snapshot(self.snapshot_path)
+        if self.db:
+            await self.db.close()
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, allowed_updates: List[str] = None):
+    server = WebhookServer(
+        bot, dp,
+        path=config.WEBHOOK_PATH,
+        secret_token=config.WEBHOOK_SECRET or None
+    )
+    await server.start(config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+    try:
+        await bot.set_webhook(
+            url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET or None,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=allowed_updates if allowed_updates is not None else dp.resolve_used_update_types()
+        )
+        logger.info("🤖 Бот запущен в режиме webhook на порту %s", config.WEBHOOK_PORT)
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+async def run(bot: Bot, dp: Dispatcher, allowed_updates: List[str] = None, handle_as_tasks: bool = True):
+    if config.BOT_MODE == "webhook":
+        await run_webhook(bot, dp, allowed_updates)
+    else:
+        await bot.delete_webhook()
+        logger.info("🤖 Бот запущен и готов к работе!")
+        polling_kwargs = {"allowed_updates": allowed_updates} if allowed_updates is not None else {}
+        await dp.start_polling(bot, handle_as_tasks=handle_as_tasks, **polling_kwargs)
+
+
+async def run_sharded(bot: Bot):
+    # Схему базы обновляет фронтальный процесс, до запуска воркеров
+    Database(config.DB_PATH).close()
+
+    frontend = ShardedFrontend(run_worker, config.WORKERS, worker_args=(asdict(config),))
+    try:
+        allowed_updates = await frontend.start()
+        dp = Dispatcher()
+        dp.update.outer_middleware(ShardMiddleware(frontend))
+        # Обновления раздаются строго по порядку получения
+        await run(bot, dp, allowed_updates, handle_as_tasks=False)
+    finally:
+        await frontend.stop()
 
-        print("🤖 Бот запущен и готов к работе!")
-        await dp.start_polling(bot)
 
+def run_worker(index: int, shards: int, updates, events, settings: dict):
+    # Точка входа процесса-воркера: настройки передаются из фронтального процесса
+    for key, value in settings.items():
+        setattr(config, key, value)
+    # Ctrl+C получает вся группа процессов, а воркеры останавливает фронтальный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    log_listener = setup_logging(
+        level=config.LOG_LEVEL,
+        module_levels=config.LOG_LEVELS,
+        json_output=config.LOG_JSON,
+        rate_limit=config.LOG_RATE_LIMIT,
+        rate_limit_interval=config.LOG_RATE_LIMIT_INTERVAL
+    )
+    try:
+        asyncio.run(_worker_main(index, shards, updates, events))
+    finally:
+        log_listener.stop()
+
+
+async def _worker_main(index: int, shards: int, updates, events):
+    bot = None
+    application = None
+    metrics_server = None
+    try:
+        bot = create_bot()
+        application = BotApplication(bot, shard=index, shards=shards)
+        dp = await application.start()
+
+        if config.METRICS_PORT:
+            metrics_server = MetricsServer()
+            await metrics_server.start(config.METRICS_HOST, config.METRICS_PORT + 1 + index)
+
+        logger.info("Воркер %s из %s готов", index, shards)
+        await serve_worker(bot, dp, application.db, index, updates, events)
     except Exception as e:
-        print(f"❌ Критическая ошибка: {e}")
+        logger.exception("❌ Критическая ошибка воркера %s: %s", index, e)
     finally:
-        await bot.session.close()
+        if application:
+            await application.stop()
+        if metrics_server:
+            await metrics_server.stop()
+        if bot:
+            await bot.session.close()
+
+
+async def main():
+    bot = None
+    application = None
+    metrics_server = None
+    try:
+        if config.BOT_MODE == "webhook" and not config.WEBHOOK_URL:
+            raise ValueError("Для режима webhook нужен WEBHOOK_URL")
+        bot = create_bot()
+
+        if config.METRICS_PORT:
+            metrics_server = MetricsServer()
+            await metrics_server.start(config.METRICS_HOST, config.METRICS_PORT)
+
+        if config.WORKERS > 1:
+            await run_sharded(bot)
+        else:
+            application = BotApplication(bot)
+            dp = await application.start()
+            await run(bot, dp)
+
+    except Exception as e:
+        logger.exception("❌ Критическая ошибка: %s", e)
+    finally:
+        if application:
+            await application.stop()
+        if metrics_server:
+            await metrics_server.stop()
+        if bot:
+            await bot.session.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    log_listener = setup_logging(
+        level=config.LOG_LEVEL,
+        module_levels=config.LOG_LEVELS,
+        json_output=config.LOG_JSON,
+        rate_limit=config.LOG_RATE_LIMIT,
+        rate_limit_interval=config.LOG_RATE_LIMIT_INTERVAL
+    )
+    try:
+        asyncio.run(main())
+    finally:
+        log_listener.stop()
\ No newline at end of file
@@ -0,0 +1,220 @@
+# Локальная замена Telegram Bot API для нагрузочных тестов без доступа к сети.
+# Отдаёт обновления через getUpdates или отправляет их на webhook, отвечает на
+# вызовы бота с заданной задержкой и возвращает 429, если превышен лимит чата.
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+
+@dataclass
+class FakeApiSettings:
+    # задержка ответа по методам, "*" — для всех остальных
+    latency: Dict[str, float] = field(default_factory=lambda: {"*": 0.02})
+    # подписанные пользователи; None — подписаны все
+    subscribed_users: Optional[set] = None
+    # лимиты Telegram: сообщений в минуту на чат и запросов в секунду всего
+    chat_messages_per_minute: int = 20
+    global_requests_per_second: int = 30
+    retry_after: int = 3
+    admins: List[int] = field(default_factory=list)
+
+
+class FakeBotApi:
+    def __init__(self, token: str, settings: FakeApiSettings = None):
+        self.token = token
+        self.settings = settings or FakeApiSettings()
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.flood_waits: Dict[str, int] = defaultdict(int)
+        # отслеживаемые обновления (нарушения): когда отданы боту и сколько ждали удаления
+        self._tracked = set()
+        self.delivered_at: Dict[int, float] = {}
+        self.reaction_times: List[float] = []
+        self._message_update: Dict[tuple, int] = {}
+        self._chat_sends: Dict[int, deque] = defaultdict(deque)
+        self._global_requests: deque = deque()
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._runner: Optional[web.AppRunner] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+
+        self.app = web.Application()
+        self.app.router.add_post(f"/bot{token}/{{method}}", self.handle)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self._host}:{self._port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081):
+        self._host, self._port = host, port
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._http = aiohttp.ClientSession()
+
+    async def stop(self):
+        if self._http:
+            await self._http.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    # === Генерация обновлений ===
+    def _new_message_id(self) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        return message_id
+
+    async def push_message(self, chat_id: int, user_id: int, text: str, track: bool = False):
+        update_id = self._next_update_id
+        self._next_update_id += 1
+        message_id = self._new_message_id()
+        if track:
+            self._tracked.add(update_id)
+            self._message_update[(chat_id, message_id)] = update_id
+
+        update = {
+            "update_id": update_id,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup", "title": f"Группа {chat_id}"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}",
+                         "username": f"user{user_id}"},
+                "text": text,
+            },
+        }
+
+        if self.webhook_url:
+            if track:
+                self.delivered_at[update_id] = time.perf_counter()
+            headers = {"X-Telegram-Bot-Api-Secret-Token": self.webhook_secret} if self.webhook_secret else {}
+            async with self._http.post(self.webhook_url, json=update, headers=headers) as response:
+                await response.read()
+        else:
+            await self.updates.put(update)
+
+    # === Обработка вызовов бота ===
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        latency = self.settings.latency.get(method, self.settings.latency.get("*", 0))
+        if latency and method != "getUpdates":
+            await asyncio.sleep(latency)
+
+        if self._is_flooded(method, params):
+            self.flood_waits[method] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.settings.retry_after}",
+                "parameters": {"retry_after": self.settings.retry_after},
+            }, status=429)
+
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    def _is_flooded(self, method: str, params: dict) -> bool:
+        if method in ("getUpdates", "getMe", "setWebhook", "deleteWebhook"):
+            return False
+
+        now = time.monotonic()
+        window = self._global_requests
+        while window and now - window[0] >= 1:
+            window.popleft()
+        if len(window) >= self.settings.global_requests_per_second:
+            return True
+        window.append(now)
+
+        if method in ("sendMessage", "editMessageText"):
+            chat_window = self._chat_sends[int(params.get("chat_id", 0))]
+            while chat_window and now - chat_window[0] >= 60:
+                chat_window.popleft()
+            if len(chat_window) >= self.settings.chat_messages_per_minute:
+                return True
+            chat_window.append(now)
+        return False
+
+    def _react(self, chat_id: int, message_ids: List[int]):
+        for message_id in message_ids:
+            update_id = self._message_update.pop((chat_id, message_id), None)
+            delivered = self.delivered_at.pop(update_id, None) if update_id else None
+            if delivered is not None:
+                self.reaction_times.append(time.perf_counter() - delivered)
+
+    async def _api_getMe(self, params):
+        return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+    async def _api_deleteWebhook(self, params):
+        self.webhook_url = None
+        return True
+
+    async def _api_setWebhook(self, params):
+        self.webhook_url = params["url"]
+        self.webhook_secret = params.get("secret_token")
+        return True
+
+    async def _api_getUpdates(self, params):
+        timeout = float(params.get("timeout", 0) or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self.updates.get(), timeout=timeout or 0.01))
+        except asyncio.TimeoutError:
+            return []
+
+        limit = int(params.get("limit", 100) or 100)
+        while len(updates) < limit and not self.updates.empty():
+            updates.append(self.updates.get_nowait())
+
+        now = time.perf_counter()
+        for update in updates:
+            if update["update_id"] in self._tracked:
+                self.delivered_at[update["update_id"]] = now
+        return updates
+
+    async def _api_getChatMember(self, params):
+        user_id = int(params["user_id"])
+        subscribed = self.settings.subscribed_users
+        status = "member" if subscribed is None or user_id in subscribed else "left"
+        return {"status": status, "user": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}}
+
+    async def _api_getChatAdministrators(self, params):
+        return [
+            {"status": "administrator", "user": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+             "can_be_edited": False, "is_anonymous": False, "can_manage_chat": True,
+             "can_delete_messages": True, "can_manage_video_chats": True, "can_restrict_members": True,
+             "can_promote_members": False, "can_change_info": True, "can_invite_users": True,
+             "can_post_stories": False, "can_edit_stories": False, "can_delete_stories": False}
+            for user_id in self.settings.admins
+        ]
+
+    async def _api_deleteMessage(self, params):
+        self._react(int(params["chat_id"]), [int(params["message_id"])])
+        return True
+
+    async def _api_deleteMessages(self, params):
+        self._react(int(params["chat_id"]), json.loads(params["message_ids"]))
+        return True
+
+    async def _api_sendMessage(self, params):
+        chat_id = int(params["chat_id"])
+        return {
+            "message_id": self._new_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "supergroup"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Fake"},
+            "text": params.get("text", ""),
+        }
+
+    async def _api_editMessageText(self, params):
+        return True
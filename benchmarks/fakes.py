@@ -0,0 +1,73 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+_message_ids = itertools.count(1)
+
+
+# Заглушка Bot: отвечает мгновенно (или с заданной задержкой) и считает вызовы
+class FakeBot:
+    def __init__(self, subscribed_users=None, api_latency: float = 0.0):
+        self.subscribed_users = subscribed_users
+        self.api_latency = api_latency
+        self.calls = {}
+
+    async def _call(self, method: str):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        else:
+            await asyncio.sleep(0)
+
+    async def get_chat_member(self, chat_id, user_id):
+        await self._call("getChatMember")
+        is_member = self.subscribed_users is None or user_id in self.subscribed_users
+        return SimpleNamespace(status="member" if is_member else "left")
+
+    async def delete_message(self, chat_id, message_id):
+        await self._call("deleteMessage")
+        return True
+
+    async def delete_messages(self, chat_id, message_ids):
+        await self._call("deleteMessages")
+        return True
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("sendMessage")
+        return FakeMessage(self, chat_id, SimpleNamespace(id=0, is_bot=True), text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        await self._call("editMessageText")
+        return True
+
+    async def get_chat_administrators(self, chat_id):
+        await self._call("getChatAdministrators")
+        return []
+
+
+# Минимальная замена aiogram.types.Message для GroupController.handle_message
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int, user, text: str):
+        self.bot = bot
+        self.message_id = next(_message_ids)
+        self.chat = SimpleNamespace(id=chat_id, title=f"Группа {chat_id}", type="supergroup")
+        self.from_user = user
+        self.text = text
+        self.caption = None
+        self.document = None
+
+    async def delete(self):
+        return await self.bot.delete_message(self.chat.id, self.message_id)
+
+    async def answer(self, text: str, **kwargs):
+        return await self.bot.send_message(self.chat.id, text, **kwargs)
+
+
+def make_user(user_id: int):
+    return SimpleNamespace(
+        id=user_id,
+        is_bot=False,
+        username=f"user{user_id}",
+        first_name=f"User {user_id}",
+        last_name=None
+    )
@@ -0,0 +1,263 @@
+# Бенчмарк пропускной способности GroupController.handle_message.
+#
+# Запуск: python -m benchmarks.handle_message --output results.json
+# Сравнение: python -m benchmarks.handle_message --compare old.json new.json
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeBot, FakeMessage, make_user  # noqa: E402
+from controllers.group_controller import GroupController  # noqa: E402
+from database import AsyncDatabase, Database  # noqa: E402
+from models import GroupSettings, StopWord  # noqa: E402
+from utils import OutboundQueue, RaidDetector  # noqa: E402
+
+WORDS = ["привет", "как", "дела", "сегодня", "хорошо", "погода", "встреча", "завтра", "вопрос", "ответ",
+         "hello", "thanks", "link", "channel", "message", "group", "every", "time", "about", "news"]
+
+
+@dataclass
+class Scenario:
+    name: str
+    messages: int = 5000
+    groups: int = 10
+    users: int = 1000
+    global_stop_words: int = 100
+    group_stop_words: int = 10
+    # глобальные шаблоны со звёздочкой и регулярные выражения
+    global_wildcards: int = 0
+    global_regexes: int = 0
+    # доля сообщений со стоп-словом
+    violation_rate: float = 0.05
+    # сколько каналов нужно для подписки и какая доля пользователей подписана
+    target_channels: int = 0
+    subscribed_rate: float = 1.0
+    slow_mode_delay: int = 0
+    concurrency: int = 1
+    api_latency: float = 0.0
+    # порог режима рейда; по умолчанию рейд не включается
+    raid_threshold: int = 10 ** 9
+    seed: int = 42
+
+
+@dataclass
+class Result:
+    scenario: Scenario
+    messages_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    api_calls: dict = field(default_factory=dict)
+
+
+SCENARIOS = [
+    Scenario("baseline"),
+    Scenario("many_stop_words", global_stop_words=5000, group_stop_words=200),
+    Scenario("many_wildcards", global_wildcards=1000),
+    Scenario("many_wildcards_and_regexes", global_wildcards=2000, global_regexes=1000),
+    Scenario("high_violation_rate", violation_rate=0.5),
+    Scenario("subscription_required", target_channels=3, subscribed_rate=0.9),
+    Scenario("slow_mode", slow_mode_delay=15, users=200),
+    Scenario("many_groups_concurrent", groups=200, users=10000, concurrency=50, api_latency=0.005),
+    Scenario("raid", groups=1, users=5000, target_channels=3, raid_threshold=30, api_latency=0.005, concurrency=50),
+]
+
+
+def _stop_word(rng: random.Random, index: int) -> str:
+    return f"{rng.choice(WORDS)[:3]}спам{index}"
+
+
+def _wildcard(rng: random.Random, index: int) -> Tuple[str, str]:
+    # (шаблон, текст, который под него подходит)
+    prefix = rng.choice(WORDS[:10])[:3]
+    return f"{prefix}*казино{index}", f"{prefix}ойказино{index}"
+
+
+def _regex(rng: random.Random, index: int) -> Tuple[str, str]:
+    prefix = rng.choice(WORDS[:10])[:3]
+    return rf"{prefix}\d{{2}}ставк[аи]{index}\b", f"{prefix}42ставки{index}"
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _build_stream(scenario: Scenario, rng: random.Random, stop_words: List[str]):
+    stream = []
+    for _ in range(scenario.messages):
+        chat_id = -1000000000000 - rng.randrange(scenario.groups)
+        user_id = rng.randrange(1, scenario.users + 1)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+        if stop_words and rng.random() < scenario.violation_rate:
+            text = f"{text} {rng.choice(stop_words)}"
+        stream.append((chat_id, user_id, text))
+    return stream
+
+
+async def _prepare(db: AsyncDatabase, scenario: Scenario, rng: random.Random) -> List[str]:
+    all_words = []
+    for index in range(scenario.global_stop_words):
+        word = _stop_word(rng, index)
+        all_words.append(word)
+        await db.add_stop_word(StopWord(word=word, is_global=True))
+
+    for index in range(scenario.global_wildcards):
+        wildcard, sample = _wildcard(rng, index)
+        all_words.append(sample)
+        await db.add_stop_word(StopWord(word=wildcard, is_global=True, kind='wildcard'))
+    for index in range(scenario.global_regexes):
+        pattern, sample = _regex(rng, index)
+        all_words.append(sample)
+        await db.add_stop_word(StopWord(word=pattern, is_global=True, kind='regex'))
+
+    channels = [f"@channel{index}" for index in range(scenario.target_channels)]
+    for group_index in range(scenario.groups):
+        group_id = str(-1000000000000 - group_index)
+        await db.save_group(GroupSettings(
+            group_id=group_id,
+            group_name=f"Группа {group_id}",
+            require_subscription=bool(channels),
+            target_channels=list(channels),
+            slow_mode_delay=scenario.slow_mode_delay
+        ))
+        for index in range(scenario.group_stop_words):
+            word = _stop_word(rng, scenario.global_stop_words + group_index * scenario.group_stop_words + index)
+            all_words.append(word)
+            await db.add_stop_word(StopWord(word=word, is_global=False, group_id=group_id))
+    return all_words
+
+
+async def run_scenario(scenario: Scenario) -> Result:
+    rng = random.Random(scenario.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = AsyncDatabase(Database(os.path.join(tmp_dir, "bench.db")))
+        await db.load_groups()
+        stop_words = await _prepare(db, scenario, rng)
+
+        subscribed = {user_id for user_id in range(1, scenario.users + 1) if rng.random() < scenario.subscribed_rate}
+        bot = FakeBot(subscribed_users=subscribed, api_latency=scenario.api_latency)
+        # Лимиты Telegram здесь не моделируются, их проверяет benchmarks/load_test.py
+        outbound = OutboundQueue(bot, global_rate=10 ** 9, chat_messages_per_minute=10 ** 9, max_in_flight=1000)
+        raid = RaidDetector(threshold=scenario.raid_threshold)
+        controller = GroupController(bot, db, outbound=outbound, raid=raid)
+        users = {}
+
+        stream = _build_stream(scenario, rng, stop_words)
+        queue = asyncio.Queue()
+        for item in stream:
+            queue.put_nowait(item)
+
+        latencies = []
+
+        async def worker():
+            while not queue.empty():
+                chat_id, user_id, text = queue.get_nowait()
+                user = users.get(user_id) or users.setdefault(user_id, make_user(user_id))
+                message = FakeMessage(bot, chat_id, user, text)
+                start = time.perf_counter()
+                await controller.handle_message(message)
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(scenario.concurrency)))
+        elapsed = time.perf_counter() - started
+        await outbound.stop()
+
+        # Фоновые задачи бенчмарка (кэши, буферы) дальше не нужны
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks():
+            if task is not current:
+                task.cancel()
+        await db.close()
+
+    latencies.sort()
+    return Result(
+        scenario=scenario,
+        messages_per_second=len(latencies) / elapsed if elapsed else 0.0,
+        p50_ms=_percentile(latencies, 50) * 1000,
+        p95_ms=_percentile(latencies, 95) * 1000,
+        p99_ms=_percentile(latencies, 99) * 1000,
+        max_ms=latencies[-1] * 1000 if latencies else 0.0,
+        api_calls=dict(bot.calls)
+    )
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _print_result(result: Result):
+    print(f"{result.scenario.name:<26} {result.messages_per_second:>10.0f} msg/s  "
+          f"p50 {result.p50_ms:7.3f} ms  p95 {result.p95_ms:7.3f} ms  p99 {result.p99_ms:7.3f} ms")
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding="utf-8") as f:
+        old = {item["scenario"]["name"]: item for item in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = {item["scenario"]["name"]: item for item in json.load(f)["results"]}
+
+    for name, result in new.items():
+        if name not in old:
+            continue
+        before, after = old[name], result
+        change = (after["messages_per_second"] / before["messages_per_second"] - 1) * 100
+        print(f"{name:<26} {before['messages_per_second']:>10.0f} -> {after['messages_per_second']:>10.0f} msg/s "
+              f"({change:+.1f}%)  p99 {before['p99_ms']:.3f} -> {after['p99_ms']:.3f} ms")
+
+
+async def main(args):
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+    results = []
+    for scenario in scenarios:
+        if args.messages:
+            scenario.messages = args.messages
+        result = await run_scenario(scenario)
+        _print_result(result)
+        results.append(result)
+
+    if args.output:
+        report = {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": [asdict(result) for result in results],
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк GroupController.handle_message")
+    parser.add_argument("--scenario", action="append", help="запустить только указанные сценарии")
+    parser.add_argument("--messages", type=int, help="количество сообщений в каждом сценарии")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два файла результатов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.compare:
+        compare(*args.compare)
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,180 @@
+# Сквозной нагрузочный тест: настоящий app.main против локального FakeBotApi.
+#
+# Запуск: python -m benchmarks.load_test --rate 200 --duration 30 --mode polling
+#         python -m benchmarks.load_test --rate 500 --workers 4
+#         python -m benchmarks.load_test --mode webhook --api-latency 0.05 --output load.json
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from benchmarks.fake_bot_api import FakeApiSettings, FakeBotApi  # noqa: E402
+from benchmarks.handle_message import WORDS, _percentile  # noqa: E402
+from config import config  # noqa: E402
+from database import Database  # noqa: E402
+from models import GroupSettings, StopWord  # noqa: E402
+
+TOKEN = "123456:LOAD-TEST"
+
+
+def _prepare_database(path: str, args):
+    db = Database(path)
+    for index in range(args.stop_words):
+        db.add_stop_word(StopWord(word=f"спам{index}", is_global=True))
+    channels = [f"@channel{index}" for index in range(args.channels)]
+    for group_index in range(args.groups):
+        db.save_group(GroupSettings(
+            group_id=str(-1000000000000 - group_index),
+            group_name=f"Группа {group_index}",
+            require_subscription=bool(channels),
+            target_channels=channels,
+            slow_mode_delay=args.slow_mode_delay
+        ))
+    db.close()
+
+
+async def _generate(api: FakeBotApi, args, rng: random.Random) -> int:
+    sent = 0
+    interval = 1 / args.rate
+    started = time.perf_counter()
+    deadline = started + args.duration
+    while time.perf_counter() < deadline:
+        chat_id = -1000000000000 - rng.randrange(args.groups)
+        user_id = rng.randrange(1, args.users + 1)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+        violation = bool(args.stop_words) and rng.random() < args.violation_rate
+        if violation:
+            text = f"{text} спам{rng.randrange(args.stop_words)}"
+        await api.push_message(chat_id, user_id, text, track=violation)
+        sent += 1
+
+        # Держим заданный темп без накопления ошибки
+        delay = started + sent * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    return sent
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    subscribed = None
+    if args.channels:
+        subscribed = {user_id for user_id in range(1, args.users + 1) if rng.random() < args.subscribed_rate}
+    api = FakeBotApi(TOKEN, FakeApiSettings(
+        latency={"*": args.api_latency},
+        subscribed_users=subscribed,
+        chat_messages_per_minute=args.chat_limit,
+        global_requests_per_second=args.global_limit,
+        retry_after=args.retry_after
+    ))
+    await api.start(port=args.api_port)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "load.db")
+        _prepare_database(db_path, args)
+
+        config.BOT_TOKEN = TOKEN
+        config.BOT_API_URL = api.base_url
+        config.DB_PATH = db_path
+        config.BOT_MODE = args.mode
+        config.WORKERS = args.workers
+        config.RAID_THRESHOLD = args.raid_threshold
+        config.LOG_LEVEL = "WARNING"
+        config.WEBHOOK_URL = f"http://127.0.0.1:{args.webhook_port}"
+        config.WEBHOOK_HOST = "127.0.0.1"
+        config.WEBHOOK_PORT = args.webhook_port
+
+        bot_task = asyncio.create_task(app.main())
+        # Ждём, пока бот подключится (getUpdates или setWebhook)
+        while not api.calls.get("getUpdates") and not api.webhook_url:
+            await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        sent = await _generate(api, args, rng)
+        generated_in = time.perf_counter() - started
+
+        # Даём боту дообработать очередь
+        drain_deadline = time.perf_counter() + args.drain_timeout
+        while (not api.updates.empty() or api.delivered_at) and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+
+        if args.mode == "polling":
+            # Останавливаем как при Ctrl+C: Dispatcher корректно завершает getUpdates
+            os.kill(os.getpid(), signal.SIGINT)
+        else:
+            bot_task.cancel()
+        try:
+            await bot_task
+        except asyncio.CancelledError:
+            pass
+        current = asyncio.current_task()
+        leftovers = [task for task in asyncio.all_tasks() if task is not current]
+        for task in leftovers:
+            task.cancel()
+        await asyncio.gather(*leftovers, return_exceptions=True)
+        await api.stop()
+
+    reactions = sorted(api.reaction_times)
+    return {
+        "mode": args.mode,
+        "workers": args.workers,
+        "rate": args.rate,
+        "duration": args.duration,
+        "updates_sent": sent,
+        "offered_rate": sent / generated_in if generated_in else 0,
+        "elapsed": elapsed,
+        "undelivered": api.updates.qsize(),
+        "unanswered_violations": len(api.delivered_at),
+        "api_calls": dict(api.calls),
+        "flood_waits": dict(api.flood_waits),
+        "deletion_latency_ms": {
+            "count": len(reactions),
+            "p50": _percentile(reactions, 50) * 1000,
+            "p95": _percentile(reactions, 95) * 1000,
+            "p99": _percentile(reactions, 99) * 1000,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота против локального Bot API")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--workers", type=int, default=1, help="процессов-воркеров, см. config.WORKERS")
+    parser.add_argument("--rate", type=float, default=100, help="обновлений в секунду")
+    parser.add_argument("--duration", type=float, default=10, help="длительность генерации, сек")
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--stop-words", type=int, default=500)
+    parser.add_argument("--violation-rate", type=float, default=0.1)
+    parser.add_argument("--channels", type=int, default=0)
+    parser.add_argument("--subscribed-rate", type=float, default=0.9)
+    parser.add_argument("--slow-mode-delay", type=int, default=0)
+    parser.add_argument("--raid-threshold", type=int, default=10 ** 9,
+                        help="порог режима рейда; по умолчанию рейд не включается")
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--chat-limit", type=int, default=20, help="сообщений в минуту на чат до 429")
+    parser.add_argument("--global-limit", type=int, default=30, help="запросов в секунду до 429")
+    parser.add_argument("--retry-after", type=int, default=3)
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8082)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="сохранить результат в JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(run(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
@@ -1,11 +1,78 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Optional
 
 
 @dataclass
 class Config:
     BOT_TOKEN: str = ""
     ADMIN_IDS: List[int] = None
+    # Адрес своего Bot API сервера, пусто — api.telegram.org
+    BOT_API_URL: str = ""
+    # "polling" или "webhook"
+    BOT_MODE: str = "polling"
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+    # Больше 1 — обновления раздаются по chat_id в отдельные процессы-воркеры;
+    # эндпоинт метрик воркера i слушает METRICS_PORT + 1 + i
+    WORKERS: int = 1
+    # Обновления одного чата ("chat") или пары чат-пользователь ("chat_user")
+    # обрабатываются по порядку, разные чаты — параллельно, не больше DISPATCH_CONCURRENCY
+    DISPATCH_ORDERING: str = "chat"
+    DISPATCH_CONCURRENCY: int = 100
+    LOG_LEVEL: str = "INFO"
+    # Уровни для отдельных модулей, например {"controllers.group_controller": "DEBUG"}
+    LOG_LEVELS: Dict[str, str] = None
+    LOG_JSON: bool = False
+    LOG_RATE_LIMIT: int = 10
+    LOG_RATE_LIMIT_INTERVAL: float = 60.0
+    # 0 — эндпоинт метрик выключен
+    METRICS_PORT: int = 0
+    METRICS_HOST: str = "127.0.0.1"
+    # Лимиты исходящих запросов к Bot API
+    OUTBOUND_GLOBAL_RATE: float = 25
+    OUTBOUND_CHAT_MESSAGES_PER_MINUTE: int = 20
+    OUTBOUND_MAX_IN_FLIGHT: int = 10
+    OUTBOUND_SEND_TTL: float = 30.0
+    # как часто отложенные удаления предупреждений сохраняются в базу, сек
+    DELETIONS_FLUSH_INTERVAL: float = 5.0
+    # не больше одного предупреждения на (пользователь, группа, причина) за окно, сек
+    WARNING_COALESCE_WINDOW: float = 10.0
+    WARNING_EDIT_INTERVAL: float = 5.0
+    # Режим рейда: порог сообщений группы за окно, время затишья до выключения,
+    # сколько секунд участник должен быть известен, чтобы писать во время рейда
+    RAID_THRESHOLD: int = 30
+    RAID_WINDOW: float = 10.0
+    RAID_COOLDOWN: float = 60.0
+    RAID_TRUSTED_AGE: float = 600.0
+    RAID_SLOW_MODE_DELAY: int = 30
+    RAID_MAX_MEMBERS: int = 200000
+    DB_PATH: str = "bot.db"
+    DB_WORKERS: int = 4
+    USERS_FLUSH_BATCH: int = 500
+    USERS_FLUSH_INTERVAL: float = 5.0
+    MODERATION_CACHE_SIZE: int = 50000
+    # Фоновое обслуживание базы: сроки хранения в днях (0 — хранить всегда),
+    # период запуска и размер пачки удаляемых строк
+    RETENTION_USERS_DAYS: float = 180
+    RETENTION_USER_MESSAGES_DAYS: float = 30
+    RETENTION_USER_VIOLATIONS_DAYS: float = 90
+    RETENTION_VIOLATION_EVENTS_DAYS: float = 90
+    MAINTENANCE_INTERVAL: float = 3600.0
+    MAINTENANCE_BATCH_SIZE: int = 500
+    MAINTENANCE_BATCH_PAUSE: float = 0.05
+    MAINTENANCE_VACUUM_PAGES: int = 1000
+    # максимальный размер файла для импорта стоп-слов, байт
+    STOP_WORDS_IMPORT_MAX_SIZE: int = 5 * 1024 * 1024
+    SLOW_MODE_MAX_ENTRIES: int = 100000
+    SLOW_MODE_SNAPSHOT_PATH: Optional[str] = None
+    SUBSCRIPTION_POSITIVE_TTL: int = 300
+    SUBSCRIPTION_NEGATIVE_TTL: int = 30
+    # Списки администраторов групп кэшируются и обновляются по chat_member
+    ADMIN_ROSTER_TTL: int = 600
 
     def __post_init__(self):
         if self.ADMIN_IDS is None:
@@ -1,21 +1,45 @@
+import math
+from typing import Optional
+
 from aiogram import Dispatcher, types, F
 from aiogram.filters import Command
-from database import Database
+from aiogram.types import BufferedInputFile
+from database import AsyncDatabase
 from views.messages import Messages
 from config import config
 from models import StopWord
+from utils import AdminRoster, DatabaseMaintenance, RaidDetector, read_stop_words
+
+# Лимит длины текстового сообщения Telegram
+MESSAGE_LIMIT = 4096
 
 
 class AdminController:
-    def __init__(self, bot, database: Database):
+    def __init__(self, bot, database: AsyncDatabase, raid: RaidDetector = None, admins: AdminRoster = None,
+                 maintenance: DatabaseMaintenance = None):
         self.bot = bot
         self.db = database
+        self.raid = raid or RaidDetector()
+        self.admins = admins or AdminRoster(bot)
+        # Есть только в процессе, который обслуживает базу
+        self.maintenance = maintenance
 
-    def _is_admin(self, user_id: int) -> bool:
+    def _is_global_admin(self, user_id: int) -> bool:
         return user_id in config.ADMIN_IDS
 
+    async def _is_admin(self, message: types.Message) -> bool:
+        # Настройки группы могут менять глобальные администраторы и администраторы этой группы
+        if self._is_global_admin(message.from_user.id):
+            return True
+        if message.chat.type not in ("group", "supergroup"):
+            return False
+        # Анонимный администратор пишет от имени самой группы
+        if message.sender_chat and message.sender_chat.id == message.chat.id:
+            return True
+        return await self.admins.is_admin(message.chat.id, message.from_user.id)
+
     async def add_global_word(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not self._is_global_admin(message.from_user.id):
             await message.answer(Messages.not_admin())
             return
 
@@ -24,12 +48,10 @@ class AdminController:
             await message.answer(Messages.no_word_provided())
             return
 
-        stop_word = StopWord(word=word, is_global=True)
-        self.db.add_stop_word(stop_word)
-        await message.answer(Messages.stop_word_added(word, True))
+        await self._add_stop_word(message, StopWord(word=word, is_global=True))
 
     async def remove_global_word(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not self._is_global_admin(message.from_user.id):
             await message.answer(Messages.not_admin())
             return
 
@@ -38,11 +60,11 @@ class AdminController:
             await message.answer("❌ Укажите слово: /remove_global_word слово")
             return
 
-        self.db.remove_stop_word(word)
+        await self.db.remove_stop_word(word)
         await message.answer(Messages.stop_word_removed(word, True))
 
     async def add_group_word(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
@@ -52,12 +74,43 @@ class AdminController:
             return
 
         group_id = str(message.chat.id)
-        stop_word = StopWord(word=word, is_global=False, group_id=group_id)
-        self.db.add_stop_word(stop_word)
-        await message.answer(Messages.stop_word_added(word, False))
+        await self._add_stop_word(message, StopWord(word=word, is_global=False, group_id=group_id))
+
+    async def add_global_regex(self, message: types.Message):
+        if not self._is_global_admin(message.from_user.id):
+            await message.answer(Messages.not_admin())
+            return
+
+        pattern = message.text.split(maxsplit=1)[1] if len(message.text.split()) > 1 else None
+        if not pattern:
+            await message.answer("❌ Укажите выражение: /add_global_regex выражение")
+            return
+
+        await self._add_stop_word(message, StopWord(word=pattern, is_global=True, kind='regex'))
+
+    async def add_group_regex(self, message: types.Message):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        pattern = message.text.split(maxsplit=1)[1] if len(message.text.split()) > 1 else None
+        if not pattern:
+            await message.answer("❌ Укажите выражение: /add_group_regex выражение")
+            return
+
+        group_id = str(message.chat.id)
+        await self._add_stop_word(message, StopWord(word=pattern, is_global=False, group_id=group_id, kind='regex'))
+
+    async def _add_stop_word(self, message: types.Message, stop_word: StopWord):
+        try:
+            await self.db.add_stop_word(stop_word)
+        except ValueError as e:
+            await message.answer(Messages.invalid_stop_word(str(e)))
+            return
+        await message.answer(Messages.stop_word_added(stop_word.word, stop_word.is_global))
 
     async def remove_group_word(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
@@ -67,11 +120,11 @@ class AdminController:
             return
 
         group_id = str(message.chat.id)
-        self.db.remove_stop_word(word, group_id)
+        await self.db.remove_stop_word(word, group_id)
         await message.answer(Messages.stop_word_removed(word, False))
 
     async def ban_user(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
@@ -82,15 +135,15 @@ class AdminController:
 
         group_id = str(message.chat.id)
         username_clean = username[1:]  # Убираем @
-        user_data = self.db.get_user_by_username(username_clean)
+        user_data = await self.db.get_user_by_username(username_clean)
         if user_data:
-            self.db.ban_user(user_data['user_id'], group_id)
+            await self.db.ban_user(user_data['user_id'], group_id)
             await message.answer(Messages.user_banned_command(username))
         else:
             await message.answer(Messages.user_not_found(username))
 
     async def unban_user(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
@@ -102,30 +155,30 @@ class AdminController:
         group_id = str(message.chat.id)
         username_clean = username[1:]  # Убираем @
 
-        user_data = self.db.get_user_by_username(username_clean)
+        user_data = await self.db.get_user_by_username(username_clean)
         if user_data:
-            self.db.unban_user(user_data['user_id'], group_id)
+            await self.db.unban_user(user_data['user_id'], group_id)
             await message.answer(Messages.user_unbanned(username))
         else:
             await message.answer(Messages.user_not_found(username))
 
     async def require_subscription_toggle(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
         group_id = str(message.chat.id)
-        group = self.db.get_group(group_id)
+        group = await self.db.get_group(group_id)
 
         if group:
             new_value = not group.require_subscription
-            self.db.update_group_settings(group_id, require_subscription=new_value)
+            await self.db.update_group_settings(group_id, require_subscription=new_value)
             await message.answer(Messages.subscription_toggled(new_value))
         else:
             await message.answer("❌ Группа не найдена в базе данных")
 
     async def set_slow_mode_delay(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
@@ -136,11 +189,88 @@ class AdminController:
 
         delay = int(delay_str)
         group_id = str(message.chat.id)
-        self.db.update_group_settings(group_id, slow_mode_delay=delay)
+        await self.db.update_group_settings(group_id, slow_mode_delay=delay)
         await message.answer(Messages.slow_mode_set(delay))
 
+    async def set_slow_mode_burst(self, message: types.Message):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        burst_str = message.text.split(maxsplit=1)[1] if len(message.text.split()) > 1 else None
+        if not burst_str or not burst_str.isdigit() or int(burst_str) < 1:
+            await message.answer("❌ Укажите количество сообщений: /set_slow_mode_burst 3")
+            return
+
+        burst = int(burst_str)
+        group_id = str(message.chat.id)
+        await self.db.update_group_settings(group_id, slow_mode_burst=burst)
+        await message.answer(Messages.slow_mode_burst_set(burst))
+
+    async def set_violation_half_life(self, message: types.Message):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        hours = self._parse_hours(message)
+        if hours is None or not 0 <= hours <= 24 * 365:
+            await message.answer("❌ Укажите количество часов: /set_violation_half_life 24")
+            return
+
+        group_id = str(message.chat.id)
+        await self.db.update_group_settings(group_id, violation_half_life=int(hours * 3600))
+        await message.answer(Messages.violation_half_life_set(hours))
+
+    async def set_violation_threshold(self, message: types.Message):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        threshold_str = message.text.split(maxsplit=1)[1] if len(message.text.split()) > 1 else None
+        if not threshold_str or not threshold_str.isdigit() or int(threshold_str) < 1:
+            await message.answer("❌ Укажите число нарушений: /set_violation_threshold 5")
+            return
+
+        threshold = int(threshold_str)
+        group_id = str(message.chat.id)
+        await self.db.update_group_settings(group_id, violation_threshold=threshold)
+        await message.answer(Messages.violation_threshold_set(threshold))
+
+    @staticmethod
+    def _parse_hours(message: types.Message) -> Optional[float]:
+        value = message.text.split(maxsplit=1)[1] if len(message.text.split()) > 1 else None
+        try:
+            hours = float(value.replace(',', '.'))
+        except (AttributeError, ValueError):
+            return None
+        return hours if math.isfinite(hours) else None
+
+    async def raid_on(self, message: types.Message):
+        await self._force_raid(message, True)
+
+    async def raid_off(self, message: types.Message):
+        await self._force_raid(message, False)
+
+    async def raid_auto(self, message: types.Message):
+        await self._force_raid(message, None)
+
+    async def raid_status(self, message: types.Message):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        await message.answer(Messages.raid_status(self.raid.is_active(str(message.chat.id))))
+
+    async def _force_raid(self, message: types.Message, active):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        self.raid.force(str(message.chat.id), active)
+        await message.answer(Messages.raid_mode_set(active))
+
     async def add_target_channel(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
@@ -150,11 +280,11 @@ class AdminController:
             return
 
         group_id = str(message.chat.id)
-        self.db.add_target_channel(group_id, channel)
+        await self.db.add_target_channel(group_id, channel)
         await message.answer(Messages.target_channel_added(channel))
 
     async def remove_target_channel(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
@@ -164,16 +294,16 @@ class AdminController:
             return
 
         group_id = str(message.chat.id)
-        self.db.remove_target_channel(group_id, channel)
+        await self.db.remove_target_channel(group_id, channel)
         await message.answer(Messages.target_channel_removed(channel))
 
     async def target_channel_list(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
         group_id = str(message.chat.id)
-        group = self.db.get_group(group_id)
+        group = await self.db.get_group(group_id)
 
         if group:
             await message.answer(Messages.target_channel_list(group.target_channels))
@@ -181,41 +311,128 @@ class AdminController:
             await message.answer("❌ Группа не найдена в базе данных")
 
     async def global_stop_words_list(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not self._is_global_admin(message.from_user.id):
             await message.answer(Messages.not_admin())
             return
 
-        words = self.db.get_global_stop_words()
-        await message.answer(Messages.global_stop_words_list(words))
+        words = await self.db.get_global_stop_words()
+        text = Messages.global_stop_words_list(words)
+        if len(text) > MESSAGE_LIMIT:
+            # Длинный список не помещается в сообщение, отправляем файлом
+            await self._send_stop_words(message, None)
+            return
+        await message.answer(text)
 
     async def group_stop_words_list(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
         group_id = str(message.chat.id)
-        words = self.db.get_group_stop_words(group_id)
-        await message.answer(Messages.group_stop_words_list(words))
+        words = await self.db.get_group_stop_words(group_id)
+        text = Messages.group_stop_words_list(words)
+        if len(text) > MESSAGE_LIMIT:
+            await self._send_stop_words(message, group_id)
+            return
+        await message.answer(text)
+
+    async def import_global_words(self, message: types.Message):
+        if not self._is_global_admin(message.from_user.id):
+            await message.answer(Messages.not_admin())
+            return
+
+        await self._import_stop_words(message, None)
+
+    async def import_group_words(self, message: types.Message):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        await self._import_stop_words(message, str(message.chat.id))
+
+    async def _import_stop_words(self, message: types.Message, group_id: str = None):
+        # Файл прикладывается к команде или команда отправляется ответом на файл
+        document = message.document or (message.reply_to_message and message.reply_to_message.document)
+        if not document:
+            await message.answer(Messages.no_document_provided())
+            return
+        if document.file_size and document.file_size > config.STOP_WORDS_IMPORT_MAX_SIZE:
+            await message.answer(Messages.document_too_large(config.STOP_WORDS_IMPORT_MAX_SIZE))
+            return
+
+        stream = await self.bot.download(document)
+        try:
+            added, duplicates, rejected = await self.db.add_stop_words(
+                read_stop_words(stream, document.file_name), group_id
+            )
+        except ValueError as e:
+            await message.answer(Messages.stop_words_import_failed(str(e)))
+            return
+        await message.answer(Messages.stop_words_imported(added, duplicates, rejected, group_id is None))
+
+    async def export_global_words(self, message: types.Message):
+        if not self._is_global_admin(message.from_user.id):
+            await message.answer(Messages.not_admin())
+            return
+
+        await self._send_stop_words(message, None)
+
+    async def export_group_words(self, message: types.Message):
+        if not await self._is_admin(message):
+            await message.answer(Messages.not_admin())
+            return
+
+        await self._send_stop_words(message, str(message.chat.id))
+
+    async def _send_stop_words(self, message: types.Message, group_id: str = None):
+        data = await self.db.export_stop_words(group_id)
+        filename = f"stop_words_{group_id}.csv" if group_id else "global_stop_words.csv"
+        await message.answer_document(BufferedInputFile(data, filename=filename),
+                                      caption=Messages.stop_words_exported(group_id is None))
+
+    async def db_stats(self, message: types.Message):
+        if not self._is_global_admin(message.from_user.id):
+            await message.answer(Messages.not_admin())
+            return
+
+        stats = await self.db.get_db_stats()
+        report = self.maintenance.last_report if self.maintenance else None
+        await message.answer(Messages.db_stats(stats, report))
 
     async def admin_help(self, message: types.Message):
-        if not self._is_admin(message.from_user.id):
+        if not await self._is_admin(message):
             await message.answer(Messages.not_admin())
             return
 
         await message.answer(Messages.admin_help())
 
     def register_handlers(self, dp: Dispatcher):
+        self.admins.register_handlers(dp)
         dp.message.register(self.add_global_word, Command("add_global_word"))
         dp.message.register(self.remove_global_word, Command("remove_global_word"))
         dp.message.register(self.add_group_word, Command("add_group_word"))
         dp.message.register(self.remove_group_word, Command("remove_group_word"))
+        dp.message.register(self.add_global_regex, Command("add_global_regex"))
+        dp.message.register(self.add_group_regex, Command("add_group_regex"))
         dp.message.register(self.ban_user, Command("ban"))
         dp.message.register(self.unban_user, Command("unban"))
         dp.message.register(self.require_subscription_toggle, Command("require_subscription_toggle"))
         dp.message.register(self.set_slow_mode_delay, Command("set_slow_mode_delay"))
+        dp.message.register(self.set_slow_mode_burst, Command("set_slow_mode_burst"))
+        dp.message.register(self.set_violation_half_life, Command("set_violation_half_life"))
+        dp.message.register(self.set_violation_threshold, Command("set_violation_threshold"))
+        dp.message.register(self.raid_on, Command("raid_on"))
+        dp.message.register(self.raid_off, Command("raid_off"))
+        dp.message.register(self.raid_auto, Command("raid_auto"))
+        dp.message.register(self.raid_status, Command("raid_status"))
         dp.message.register(self.add_target_channel, Command("add_target_channel"))
         dp.message.register(self.remove_target_channel, Command("remove_target_channel"))
         dp.message.register(self.target_channel_list, Command("target_channel_list"))
         dp.message.register(self.global_stop_words_list, Command("global_stop_words_list"))
         dp.message.register(self.group_stop_words_list, Command("group_stop_words_list"))
+        dp.message.register(self.import_global_words, Command("import_global_words"))
+        dp.message.register(self.import_group_words, Command("import_group_words"))
+        dp.message.register(self.export_global_words, Command("export_global_words"))
+        dp.message.register(self.export_group_words, Command("export_group_words"))
+        dp.message.register(self.db_stats, Command("db_stats"))
         dp.message.register(self.admin_help, Command("admin", "start", "help"))
\ No newline at end of file
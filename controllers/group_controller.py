@@ -1,142 +1,172 @@
-import asyncio
+import logging
+import time
 from aiogram import Dispatcher, types, F
 from aiogram.filters import Command
-from database import Database
+from database import AsyncDatabase
 from views.messages import Messages
-from models import GroupSettings, UserViolation, UserMessage, StopWord
-from datetime import datetime
-from utils import Helpers
+from models import GroupSettings, UserViolation, StopWord
+from utils import OutboundQueue, RaidDetector, SlowModeLimiter, SubscriptionCache, WarningCoalescer, canonicalize
+from utils.metrics import MESSAGE_LATENCY, MESSAGES, STAGE_LATENCY
 from views import messages
 
+logger = logging.getLogger(__name__)
+RATE_LIMITED = {'rate_limit': True}
+
 
 class GroupController:
-    def __init__(self, bot, database: Database):
+    def __init__(self, bot, database: AsyncDatabase, slow_mode: SlowModeLimiter = None,
+                 subscriptions: SubscriptionCache = None, outbound: OutboundQueue = None,
+                 warnings: WarningCoalescer = None, raid: RaidDetector = None):
         self.bot = bot
         self.db = database
+        self.slow_mode = slow_mode or SlowModeLimiter()
+        self.subscriptions = subscriptions or SubscriptionCache(bot)
+        self.outbound = outbound or OutboundQueue(bot)
+        self.warnings = warnings or WarningCoalescer(self.outbound)
+        self.raid = raid or RaidDetector()
 
     async def check_subscription(self, user_id: int, channels: list) -> bool:
-        for channel in channels:
-            try:
-                chat_member = await self.bot.get_chat_member(channel, user_id)
-                if chat_member.status not in ['member', 'administrator', 'creator']:
-                    return False
-            except Exception as e:
-                print(f"Ошибка проверки подписки: {e}")
-                return False
-        return True
-
-    def contains_stop_words(self, text: str, group_id: str) -> bool:
-        stop_words = self.db.get_stop_words(group_id)
-        text_lower = text.lower()
-        return any(word.word in text_lower for word in stop_words)
+        return await self.subscriptions.check(user_id, channels)
+
+    async def contains_stop_words(self, text: str, group_id: str) -> bool:
+        matcher = await self.db.get_stop_word_matcher(group_id)
+        return matcher.matches(canonicalize(text), text)
 
     async def handle_message(self, message: types.Message):
-        print(f"🔔 Бот получил сообщение в группе {message.chat.id}")
-        print(f"📝 Текст: {message.text}")
-        print(f"👤 От: {message.from_user.id}")
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            outcome = await self._moderate(message)
+        finally:
+            MESSAGE_LATENCY.observe(time.perf_counter() - start, outcome)
+            MESSAGES.inc(message.chat.id, outcome)
 
-        if message.from_user.is_bot:
-            print("🤖 Игнорируем сообщение от бота")
-            return
+    async def _moderate(self, message: types.Message) -> str:
+        logger.debug("🔔 Сообщение в группе %s от %s: %r", message.chat.id, message.from_user.id, message.text)
 
-        user = message.from_user
-        self.db.save_user(
-            user_id=user.id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name
-        )
+        if message.from_user.is_bot:
+            logger.debug("🤖 Игнорируем сообщение от бота")
+            return "ignored_bot"
 
         user_id = message.from_user.id
-        group_id = str(message.chat.id)
+        chat_id = message.chat.id
+        group_id = str(chat_id)
+
+        # Во время рейда сообщения новых участников удаляются до любых запросов к базе и API
+        raid = self.raid.observe(group_id, user_id)
+        if raid and not self.raid.is_trusted(group_id, user_id):
+            logger.info("🗑 Сообщение удалено: режим рейда, новый участник (группа %s, пользователь %s)",
+                        group_id, user_id, extra=RATE_LIMITED)
+            self.outbound.delete(chat_id, message.message_id)
+            return "deleted_raid"
 
-        group_settings = self.db.get_group(group_id)
-        if not group_settings:
-            group_settings = GroupSettings(
-                group_id=group_id,
-                group_name=message.chat.title
+        user = message.from_user
+        with STAGE_LATENCY.time("user_upsert"):
+            await self.db.save_user(
+                user_id=user.id,
+                username=user.username,
+                first_name=user.first_name,
+                last_name=user.last_name
             )
-            self.db.save_group(group_settings)
-
-        print(f"⚙️ Настройки группы: require_subscription={group_settings.require_subscription}, "
-              f"slow_mode_delay={group_settings.slow_mode_delay}, "
-              f"target_channels={group_settings.target_channels}")
-
-        user_violations = self.db.get_user_violations(user_id, group_id)
-        if user_violations and user_violations.violations_count >= 5:
-            print("🗑 Сообщение удалено: 5 нарушений")
-            await message.delete()
-            return
-
-        user_banned = self.db.get_user_banned(user_id, group_id)
-        if user_banned:
-            print("🗑 Сообщение удалено: пользователь забанен")
-            await message.delete()
-            return
-
-        if group_settings.require_subscription and group_settings.target_channels:
-            print("🔍 Проверяем подписку...")
-            is_subscribed = await self.check_subscription(user_id, group_settings.target_channels)
+
+        with STAGE_LATENCY.time("group_lookup"):
+            group_settings = await self.db.get_group(group_id)
+            if not group_settings:
+                group_settings = GroupSettings(
+                    group_id=group_id,
+                    group_name=message.chat.title
+                )
+                await self.db.save_group(group_settings)
+
+        logger.debug("⚙️ Настройки группы %s: %s", group_id, group_settings)
+
+        with STAGE_LATENCY.time("ban_check"):
+            user_violations = await self.db.get_user_violations(user_id, group_id)
+
+        # Блокировка за нарушения снимается сама, когда их счёт затухнет
+        if user_violations and user_violations.is_blocked():
+            logger.info("🗑 Сообщение удалено: превышен порог нарушений (группа %s, пользователь %s)",
+                        group_id, user_id, extra=RATE_LIMITED)
+            self.outbound.delete(chat_id, message.message_id)
+            return "deleted_violations"
+
+        if user_violations and user_violations.banned:
+            logger.info("🗑 Сообщение удалено: пользователь забанен (группа %s, пользователь %s)",
+                        group_id, user_id, extra=RATE_LIMITED)
+            self.outbound.delete(chat_id, message.message_id)
+            return "deleted_banned"
+
+        # Проверка подписки обращается к API, во время рейда её пропускаем
+        if group_settings.require_subscription and group_settings.target_channels and not raid:
+            with STAGE_LATENCY.time("subscription_check"):
+                is_subscribed = await self.check_subscription(user_id, group_settings.target_channels)
             if not is_subscribed:
-                print("🗑 Сообщение удалено: нет подписки на каналы")
-                await message.delete()
-                warning = await message.answer(
+                logger.info("🗑 Сообщение удалено: нет подписки на каналы (группа %s, пользователь %s)",
+                            group_id, user_id, extra=RATE_LIMITED)
+                self.outbound.delete(chat_id, message.message_id)
+                self.warnings.warn(
+                    chat_id, user_id, "subscription",
                     Messages.subscription_required(
                         message.from_user.first_name,
                         group_settings.target_channels
-                    )
+                    ),
+                    delete_after=15
                 )
-                asyncio.create_task(Helpers.delete_message_after(warning, 15))
-                return
-
-        user_message = self.db.get_user_message_time(user_id, group_id)
-        if user_message:
-            last_time = datetime.fromisoformat(user_message.last_message_time)
-            time_diff = (datetime.now() - last_time).total_seconds()
-            print(f"⏰ Время с последнего сообщения: {time_diff:.1f} сек, лимит: {group_settings.slow_mode_delay} сек")
-            if time_diff < group_settings.slow_mode_delay:
-                print("🗑 Сообщение удалено: медленный режим")
-                await message.delete()
-                remaining_time = int(group_settings.slow_mode_delay - time_diff)
-                slow_mode_warning = await message.answer(
-                    Messages.slow_mode_warning(remaining_time)
-                )
-                asyncio.create_task(Helpers.delete_message_after(slow_mode_warning, min(2, remaining_time)))
-                return
+                return "deleted_subscription"
+
+        slow_mode_delay, slow_mode_burst = group_settings.slow_mode_delay, group_settings.slow_mode_burst
+        if raid:
+            slow_mode_delay, slow_mode_burst = max(slow_mode_delay, self.raid.slow_mode_delay), 1
+        with STAGE_LATENCY.time("slow_mode"):
+            remaining_time = self.slow_mode.check(user_id, group_id, slow_mode_delay, slow_mode_burst)
+        if remaining_time:
+            logger.info("🗑 Сообщение удалено: медленный режим, осталось %.1f сек (группа %s, пользователь %s)",
+                        remaining_time, group_id, user_id, extra=RATE_LIMITED)
+            self.outbound.delete(chat_id, message.message_id)
+            if raid:
+                return "deleted_slow_mode"
+            remaining_time = max(1, int(remaining_time))
+            self.warnings.warn(
+                chat_id, user_id, "slow_mode",
+                Messages.slow_mode_warning(remaining_time),
+                delete_after=min(2, remaining_time)
+            )
+            return "deleted_slow_mode"
+
+        if message.text:
+            with STAGE_LATENCY.time("stop_words"):
+                has_stop_words = await self.contains_stop_words(message.text, group_id)
+        else:
+            has_stop_words = False
 
-        if message.text and self.contains_stop_words(message.text, group_id):
-            print("🗑 Сообщение удалено: содержит стоп-слово")
-            await message.delete()
+        if has_stop_words:
+            logger.info("🗑 Сообщение удалено: содержит стоп-слово (группа %s, пользователь %s)",
+                        group_id, user_id)
+            self.outbound.delete(chat_id, message.message_id)
+            self.slow_mode.refund(user_id, group_id)
 
-            if user_violations:
-                user_violations.violations_count += 1
-                user_violations.last_violation_time = datetime.now().isoformat()
-            else:
+            if not user_violations:
                 user_violations = UserViolation(
                     user_id=user_id,
                     group_id=group_id,
                     username=message.from_user.username,
-                    first_name=message.from_user.first_name,
-                    violations_count=1
+                    first_name=message.from_user.first_name
                 )
+            blocked = user_violations.add_violation(group_settings.violation_half_life,
+                                                    group_settings.violation_threshold)
 
-            self.db.save_user_violations(user_violations)
+            await self.db.record_violation(user_violations, "stop_word")
 
-            warning = await message.answer(Messages.stop_word_warning())
-            asyncio.create_task(Helpers.delete_message_after(warning, 15))
+            if raid:
+                return "deleted_stop_word"
+            self.warnings.warn(chat_id, user_id, "stop_word", Messages.stop_word_warning(), delete_after=15)
 
-            if user_violations.violations_count >= 5:
-                ban_msg = await message.answer(Messages.user_banned())
-                asyncio.create_task(Helpers.delete_message_after(ban_msg, 15))
-            return
+            if blocked:
+                self.warnings.warn(chat_id, user_id, "banned", Messages.user_banned(), delete_after=15)
+            return "deleted_stop_word"
 
-        print("✅ Сообщение разрешено")
-        new_user_message = UserMessage(
-            user_id=user_id,
-            group_id=group_id,
-            last_message_time=datetime.now().isoformat()
-        )
-        self.db.save_user_message_time(new_user_message)
+        logger.debug("✅ Сообщение разрешено (группа %s, пользователь %s)", group_id, user_id, extra=RATE_LIMITED)
+        return "allowed"
 
     def register_handlers(self, dp: Dispatcher):
         dp.message.register(self.handle_message, F.chat.type.in_(["group", "supergroup"]))
\ No newline at end of file
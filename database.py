@@ -1,216 +1,275 @@
 # database.py
+import asyncio
+import logging
 import sqlite3
-from typing import List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, List, Optional, Tuple
+from migrations import migrate
 from models import GroupSettings, UserViolation, UserMessage, StopWord
-from datetime import datetime
+from utils import (LRUCache, StopWordMatcher, UserDirectoryBuffer, canonicalize, normalize_stop_word,
+                   write_stop_words)
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
 
 
 class Database:
+    # auto_vacuum — до journal_mode: переход в WAL записывает заголовок файла,
+    # после чего режим очистки новой базы уже не меняется без VACUUM
+    PRAGMAS = (
+        'PRAGMA auto_vacuum = INCREMENTAL',
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA busy_timeout = 5000',
+        'PRAGMA temp_store = MEMORY',
+        'PRAGMA cache_size = -16000',
+        'PRAGMA mmap_size = 134217728',
+        'PRAGMA foreign_keys = ON',
+    )
+
     def __init__(self, db_path="bot.db"):
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.init_db()
 
-    def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _connect(self) -> sqlite3.Connection:
+        # Долгоживущее соединение на каждый поток: в режиме WAL чтения не ждут записи
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
 
-        # Таблица настроек групп
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS groups
-            (
-                group_id TEXT PRIMARY KEY,
-                group_name TEXT,
-                require_subscription BOOLEAN DEFAULT 1,
-                target_channels TEXT DEFAULT '[]',
-                slow_mode_delay INTEGER DEFAULT 15
-            )
-        ''')
-
-        # Таблица стоп-слов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stop_words
-            (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                word TEXT NOT NULL,
-                is_global BOOLEAN DEFAULT 0,
-                group_id TEXT
-            )
-        ''')
-
-        # Таблица нарушений пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_violations
-            (
-                user_id INTEGER,
-                group_id TEXT,
-                username TEXT,
-                first_name TEXT,
-                banned BOOLEAN DEFAULT 0,
-                violations_count INTEGER DEFAULT 0,
-                last_violation_time TEXT,
-                PRIMARY KEY (user_id, group_id)
-            )
-        ''')
-
-        # Таблица времени сообщений для медленного режима
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_messages
-            (
-                user_id INTEGER,
-                group_id TEXT,
-                last_message_time TEXT,
-                PRIMARY KEY (user_id, group_id)
-            )
-        ''')
-
-        # Таблица пользователей для поиска по username
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users
-            (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT UNIQUE,
-                first_name TEXT,
-                last_name TEXT,
-                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        conn.commit()
-        conn.close()
+    def init_db(self):
+        # Схема создаётся и обновляется версионными миграциями, см. migrations.py
+        migrate(self._connect())
 
     # === Методы для групп ===
+    GROUP_COLUMNS = ('group_id, group_name, require_subscription, target_channels, slow_mode_delay, slow_mode_burst, '
+                     'violation_half_life, violation_threshold')
+
+    @staticmethod
+    def _group_from_row(result) -> GroupSettings:
+        return GroupSettings.from_dict({
+            'group_id': result[0],
+            'group_name': result[1],
+            'require_subscription': result[2],
+            'target_channels': result[3],
+            'slow_mode_delay': result[4],
+            'slow_mode_burst': result[5],
+            'violation_half_life': result[6],
+            'violation_threshold': result[7]
+        })
+
     def get_group(self, group_id: str) -> Optional[GroupSettings]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM groups WHERE group_id = ?', (group_id,))
+        cursor = self._connect().cursor()
+        cursor.execute(f'SELECT {self.GROUP_COLUMNS} FROM groups WHERE group_id = ?', (group_id,))
         result = cursor.fetchone()
-        conn.close()
 
         if result:
-            return GroupSettings.from_dict({
-                'group_id': result[0],
-                'group_name': result[1],
-                'require_subscription': result[2],
-                'target_channels': result[3],
-                'slow_mode_delay': result[4]
-            })
+            return self._group_from_row(result)
         return None
 
-    def save_group(self, group: GroupSettings):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_all_groups(self) -> List[GroupSettings]:
+        cursor = self._connect().cursor()
+        cursor.execute(f'SELECT {self.GROUP_COLUMNS} FROM groups')
 
-        data = group.to_dict()
-        cursor.execute('''
-            INSERT OR REPLACE INTO groups 
-            (group_id, group_name, require_subscription, target_channels, slow_mode_delay)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (data['group_id'], data['group_name'], data['require_subscription'],
-              data['target_channels'], data['slow_mode_delay']))
+        groups = []
+        for result in cursor.fetchall():
+            groups.append(self._group_from_row(result))
 
-        conn.commit()
-        conn.close()
+        return groups
 
-    def update_group_settings(self, group_id: str, **kwargs):
+    def save_group(self, group: GroupSettings):
+        conn = self._connect()
+        data = group.to_dict()
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO groups
+                (group_id, group_name, require_subscription, target_channels, slow_mode_delay, slow_mode_burst,
+                 violation_half_life, violation_threshold)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (data['group_id'], data['group_name'], data['require_subscription'],
+                  data['target_channels'], data['slow_mode_delay'], data['slow_mode_burst'],
+                  data['violation_half_life'], data['violation_threshold']))
+
+    def update_group_settings(self, group_id: str, **kwargs) -> Optional[GroupSettings]:
         group = self.get_group(group_id)
         if not group:
-            return
+            return None
 
         for key, value in kwargs.items():
             if hasattr(group, key):
                 setattr(group, key, value)
 
         self.save_group(group)
+        return group
 
     # === Методы для стоп-слов ===
     def get_stop_words(self, group_id: str = None) -> List[StopWord]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._connect().cursor()
 
         if group_id:
             cursor.execute('''
-                SELECT word, is_global, group_id
+                SELECT word, is_global, group_id, kind
                 FROM stop_words
                 WHERE is_global = 1 OR group_id = ?
             ''', (group_id,))
         else:
-            cursor.execute('SELECT word, is_global, group_id FROM stop_words WHERE is_global = 1')
+            cursor.execute('SELECT word, is_global, group_id, kind FROM stop_words WHERE is_global = 1')
 
         words = []
         for row in cursor.fetchall():
             words.append(StopWord.from_dict({
                 'word': row[0],
                 'is_global': row[1],
-                'group_id': row[2]
+                'group_id': row[2],
+                'kind': row[3]
             }))
 
-        conn.close()
         return words
 
-    def add_stop_word(self, stop_word: StopWord):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def build_stop_word_matcher(self, group_id: str) -> StopWordMatcher:
+        # Слова хранятся в канонической форме, как и текст, который с ними сравнивается.
+        # Все шаблоны группы собираются в одно выражение, пересобирается оно вместе с кэшем
+        words, wildcards, regexes = [], [], []
+        for stop_word in self.get_stop_words(group_id):
+            if stop_word.kind == 'word':
+                words.append(stop_word.word)
+                continue
+            try:
+                word, kind = normalize_stop_word(stop_word.word, stop_word.kind)
+            except ValueError as e:
+                logger.warning("Пропущено недопустимое стоп-слово %r: %s", stop_word.word, e)
+                continue
+            (regexes if kind == 'regex' else wildcards).append(word)
+        return StopWordMatcher(words, wildcards, regexes)
 
+    def add_stop_word(self, stop_word: StopWord):
+        # ValueError, если шаблон или регулярное выражение недопустимы
+        conn = self._connect()
         data = stop_word.to_dict()
-        cursor.execute('''
-            INSERT OR IGNORE INTO stop_words (word, is_global, group_id)
-            VALUES (?, ?, ?)
-        ''', (data['word'], data['is_global'], data['group_id']))
-
-        conn.commit()
-        conn.close()
-
-    def remove_stop_word(self, word: str, group_id: str = None):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
+        word, kind = normalize_stop_word(data['word'], data['kind'])
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO stop_words (word, is_global, group_id, kind, original)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (word, data['is_global'], data['group_id'], kind, stop_word.word.strip()))
+
+    def add_stop_words(self, words: Iterable[Tuple[str, str]], group_id: str = None) -> Tuple[int, int, int]:
+        # Массовая загрузка пар (слово, тип) одной транзакцией; words читается лениво.
+        # Возвращает (добавлено, уже было или повтор, отклонено)
+        conn = self._connect()
+        seen = set()
+        counts = {'total': 0, 'rejected': 0}
+
+        def rows():
+            for word, kind in words:
+                counts['total'] += 1
+                try:
+                    stored, kind = normalize_stop_word(word, kind)
+                except ValueError:
+                    counts['rejected'] += 1
+                    continue
+                if stored in seen:
+                    continue
+                seen.add(stored)
+                yield stored, 0 if group_id else 1, group_id, kind, word
+
+        before = conn.total_changes
+        with conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO stop_words (word, is_global, group_id, kind, original)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows())
+        added = conn.total_changes - before
+        return added, counts['total'] - counts['rejected'] - added, counts['rejected']
+
+    def export_stop_words(self, group_id: str = None) -> bytes:
+        cursor = self._connect().cursor()
         if group_id:
-            cursor.execute('DELETE FROM stop_words WHERE word = ? AND group_id = ?', (word.lower(), group_id))
+            cursor.execute('SELECT IFNULL(original, word), kind FROM stop_words WHERE group_id = ? ORDER BY word',
+                           (group_id,))
         else:
-            cursor.execute('DELETE FROM stop_words WHERE word = ? AND is_global = 1', (word.lower(),))
+            cursor.execute('SELECT IFNULL(original, word), kind FROM stop_words WHERE is_global = 1 ORDER BY word')
+        return write_stop_words(cursor)
 
-        conn.commit()
-        conn.close()
+    def remove_stop_word(self, word: str, group_id: str = None):
+        conn = self._connect()
+        # Слово, шаблон или выражение — удаляем запись в любой из форм хранения
+        # или по написанию, в котором слово было добавлено
+        forms = {word, canonicalize(word)}
+        try:
+            forms.add(normalize_stop_word(word, 'wildcard')[0])
+        except ValueError:
+            pass
+        forms = list(forms)
+        placeholders = ', '.join('?' * len(forms))
+        with conn:
+            if group_id:
+                conn.execute(f'DELETE FROM stop_words WHERE (word IN ({placeholders}) OR original = ?) AND group_id = ?',
+                             forms + [word, group_id])
+            else:
+                conn.execute(f'DELETE FROM stop_words WHERE (word IN ({placeholders}) OR original = ?) AND is_global = 1',
+                             forms + [word])
 
     def get_global_stop_words(self) -> List[StopWord]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT word, is_global, group_id FROM stop_words WHERE is_global = 1')
+        cursor = self._connect().cursor()
+        cursor.execute('SELECT word, is_global, group_id, kind, original FROM stop_words WHERE is_global = 1')
 
         words = []
         for row in cursor.fetchall():
             words.append(StopWord.from_dict({
                 'word': row[0],
                 'is_global': row[1],
-                'group_id': row[2]
+                'group_id': row[2],
+                'kind': row[3],
+                'original': row[4]
             }))
 
-        conn.close()
         return words
 
     def get_group_stop_words(self, group_id: str) -> List[StopWord]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT word, is_global, group_id FROM stop_words WHERE group_id = ?', (group_id,))
+        cursor = self._connect().cursor()
+        cursor.execute('SELECT word, is_global, group_id, kind, original FROM stop_words WHERE group_id = ?', (group_id,))
 
         words = []
         for row in cursor.fetchall():
             words.append(StopWord.from_dict({
                 'word': row[0],
                 'is_global': row[1],
-                'group_id': row[2]
+                'group_id': row[2],
+                'kind': row[3],
+                'original': row[4]
             }))
 
-        conn.close()
         return words
 
     # === Методы для нарушений и банов ===
     def get_user_violations(self, user_id: int, group_id: str) -> Optional[UserViolation]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM user_violations WHERE user_id = ? AND group_id = ?', (user_id, group_id))
+        cursor = self._connect().cursor()
+        cursor.execute('''
+            SELECT user_id, group_id, username, first_name, banned, violations_count, last_violation_time,
+                   score, score_updated_at, blocked_until
+            FROM user_violations WHERE user_id = ? AND group_id = ?
+        ''', (user_id, group_id))
         result = cursor.fetchone()
-        conn.close()
 
         if result:
             return UserViolation.from_dict({
@@ -220,74 +279,75 @@ class Database:
                 'first_name': result[3],
                 'banned': result[4],
                 'violations_count': result[5],
-                'last_violation_time': result[6]
+                'last_violation_time': result[6],
+                'score': result[7],
+                'score_updated_at': result[8],
+                'blocked_until': result[9]
             })
         return None
 
     def save_user_violations(self, violation: UserViolation):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        conn = self._connect()
+        with conn:
+            self._save_user_violations(conn, violation)
 
+    @staticmethod
+    def _save_user_violations(conn: sqlite3.Connection, violation: UserViolation):
         data = violation.to_dict()
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_violations 
-            (user_id, group_id, username, first_name, banned, violations_count, last_violation_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+        conn.execute('''
+            INSERT OR REPLACE INTO user_violations
+            (user_id, group_id, username, first_name, banned, violations_count, last_violation_time,
+             score, score_updated_at, blocked_until)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             data['user_id'], data['group_id'], data['username'],
             data['first_name'], data['banned'], data['violations_count'],
-            data['last_violation_time']
+            data['last_violation_time'], data['score'], data['score_updated_at'], data['blocked_until']
         ))
 
-        conn.commit()
-        conn.close()
+    def record_violation(self, violation: UserViolation, reason: str):
+        # Счёт пользователя и запись в истории сохраняются одной транзакцией
+        conn = self._connect()
+        with conn:
+            self._save_user_violations(conn, violation)
+            conn.execute('''
+                INSERT INTO violation_events (group_id, user_id, ts, reason)
+                VALUES (?, ?, ?, ?)
+            ''', (violation.group_id, violation.user_id, violation.score_updated_at, reason))
 
     def ban_user(self, user_id: int, group_id: str):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        violations = self.get_user_violations(user_id, group_id)
-        if violations:
-            cursor.execute('UPDATE user_violations SET banned = 1 WHERE user_id = ? AND group_id = ?', 
-                         (user_id, group_id))
-        else:
-            cursor.execute('INSERT INTO user_violations (user_id, group_id, banned, violations_count) VALUES (?, ?, 1, 0)', 
-                         (user_id, group_id))
-
-        conn.commit()
-        conn.close()
+        conn = self._connect()
+        with conn:
+            violations = self.get_user_violations(user_id, group_id)
+            if violations:
+                conn.execute('UPDATE user_violations SET banned = 1 WHERE user_id = ? AND group_id = ?',
+                             (user_id, group_id))
+            else:
+                conn.execute('INSERT INTO user_violations (user_id, group_id, banned, violations_count) VALUES (?, ?, 1, 0)',
+                             (user_id, group_id))
 
     def unban_user(self, user_id: int, group_id: str):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE user_violations SET banned = 0 WHERE user_id = ? AND group_id = ?', 
-                     (user_id, group_id))
-        conn.commit()
-        conn.close()
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE user_violations SET banned = 0 WHERE user_id = ? AND group_id = ?',
+                         (user_id, group_id))
 
     def reset_violations(self, user_id: int, group_id: str):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM user_violations WHERE user_id = ? AND group_id = ?', (user_id, group_id))
-        conn.commit()
-        conn.close()
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM user_violations WHERE user_id = ? AND group_id = ?', (user_id, group_id))
 
     def get_user_banned(self, user_id: int, group_id: str) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT banned FROM user_violations WHERE user_id = ? AND group_id = ? AND banned = 1', 
-                     (user_id, group_id))
-        result = cursor.fetchone()
-        conn.close()
-        return result is not None
+        cursor = self._connect().cursor()
+        cursor.execute('SELECT banned FROM user_violations WHERE user_id = ? AND group_id = ? AND banned = 1',
+                       (user_id, group_id))
+        return cursor.fetchone() is not None
 
     # === Методы для медленного режима ===
     def get_user_message_time(self, user_id: int, group_id: str) -> Optional[UserMessage]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._connect().cursor()
         cursor.execute('SELECT * FROM user_messages WHERE user_id = ? AND group_id = ?', (user_id, group_id))
         result = cursor.fetchone()
-        conn.close()
 
         if result:
             return UserMessage.from_dict({
@@ -298,35 +358,36 @@ class Database:
         return None
 
     def save_user_message_time(self, user_message: UserMessage):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
+        conn = self._connect()
         data = user_message.to_dict()
-        cursor.execute('''
-            INSERT OR REPLACE INTO user_messages 
-            (user_id, group_id, last_message_time) VALUES (?, ?, ?)
-        ''', (data['user_id'], data['group_id'], data['last_message_time']))
-
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO user_messages
+                (user_id, group_id, last_message_time) VALUES (?, ?, ?)
+            ''', (data['user_id'], data['group_id'], data['last_message_time']))
 
     # === Методы для пользователей ===
     def save_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, username, first_name, last_name))
-        conn.commit()
-        conn.close()
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, username, first_name, last_name))
+
+    def save_users(self, users: List[tuple]):
+        # users: [(user_id, username, first_name, last_name), ...]
+        conn = self._connect()
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO users (user_id, username, first_name, last_name)
+                VALUES (?, ?, ?, ?)
+            ''', users)
 
     def get_user_by_username(self, username: str) -> Optional[dict]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._connect().cursor()
         cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
         result = cursor.fetchone()
-        conn.close()
 
         if result:
             return {
@@ -337,21 +398,378 @@ class Database:
             }
         return None
 
+    # === Методы для отложенных удалений ===
+    def get_pending_deletions(self) -> List[tuple]:
+        cursor = self._connect().cursor()
+        cursor.execute('SELECT chat_id, message_id, due_at FROM pending_deletions')
+        return cursor.fetchall()
+
+    def add_pending_deletions(self, rows: List[tuple]):
+        # rows: [(chat_id, message_id, due_at), ...]
+        conn = self._connect()
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO pending_deletions (chat_id, message_id, due_at)
+                VALUES (?, ?, ?)
+            ''', rows)
+
+    def remove_pending_deletions(self, rows: List[tuple]):
+        # rows: [(chat_id, message_id), ...]
+        conn = self._connect()
+        with conn:
+            conn.executemany('DELETE FROM pending_deletions WHERE chat_id = ? AND message_id = ?', rows)
+
+    # === Обслуживание базы ===
+    # Таблицы, которые растут без ограничений, и условия устаревания их строк.
+    # Параметры условия: граница по времени и текущее время (unix)
+    RETENTION_TABLES = ('users', 'user_messages', 'user_violations', 'violation_events')
+
+    @staticmethod
+    def _retention_condition(table: str, cutoff: float, now: float) -> tuple:
+        if table == 'users':
+            # last_seen заполняет SQLite: CURRENT_TIMESTAMP, UTC
+            return 'last_seen < ?', (datetime.fromtimestamp(cutoff, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),)
+        if table == 'user_messages':
+            return 'last_message_time < ?', (datetime.fromtimestamp(cutoff).isoformat(),)
+        if table == 'user_violations':
+            # Баны и действующие блокировки не удаляются
+            return ('(score_updated_at < ? OR score_updated_at IS NULL) AND banned = 0 '
+                    'AND (blocked_until IS NULL OR blocked_until < ?)', (cutoff, now))
+        if table == 'violation_events':
+            # События пишутся по времени, самые старые — в начале таблицы
+            return 'ts < ? ORDER BY rowid', (cutoff,)
+        raise ValueError(f"Для таблицы {table} не задан срок хранения")
+
+    def prune(self, table: str, max_age: float, batch_size: int) -> int:
+        # Удаляет не больше batch_size строк старше max_age секунд одной короткой транзакцией
+        now = time.time()
+        condition, params = self._retention_condition(table, now - max_age, now)
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(f'''
+                DELETE FROM {table} WHERE rowid IN (
+                    SELECT rowid FROM {table} WHERE {condition} LIMIT ?
+                )
+            ''', params + (batch_size,))
+        return cursor.rowcount
+
+    def incremental_vacuum(self, max_pages: int) -> int:
+        # Возвращает файлу до max_pages свободных страниц; результат — сколько вернули
+        conn = self._connect()
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # execute() делает у этой прагмы один шаг и освобождает одну страницу,
+        # executescript() выполняет её до конца
+        conn.executescript(f'PRAGMA incremental_vacuum({int(max_pages)})')
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+        return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    def analyze(self):
+        conn = self._connect()
+        # Приблизительная статистика: ANALYZE читает ограниченное число строк каждого индекса
+        conn.execute('PRAGMA analysis_limit = 1000')
+        conn.execute('ANALYZE')
+
+    def get_db_stats(self) -> dict:
+        conn = self._connect()
+        stats = {
+            'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+            'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+            'freelist_count': conn.execute('PRAGMA freelist_count').fetchone()[0],
+            'tables': {},
+        }
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        for table in tables:
+            stats['tables'][table] = {'rows': conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0], 'bytes': None}
+        try:
+            # Размер таблицы вместе с её индексами; dbstat есть не во всех сборках SQLite
+            for table, size in conn.execute('''
+                SELECT m.tbl_name, SUM(s.pgsize)
+                FROM dbstat s JOIN sqlite_master m ON m.name = s.name
+                GROUP BY m.tbl_name
+            '''):
+                if table in stats['tables']:
+                    stats['tables'][table]['bytes'] = size
+        except sqlite3.OperationalError:
+            pass
+        return stats
+
     # === Методы для каналов подписки ===
-    def add_target_channel(self, group_id: str, channel: str):
+    def add_target_channel(self, group_id: str, channel: str) -> Optional[GroupSettings]:
         group = self.get_group(group_id)
         if not group:
-            return
+            return None
 
         if channel not in group.target_channels:
             group.target_channels.append(channel)
             self.save_group(group)
+        return group
 
-    def remove_target_channel(self, group_id: str, channel: str):
+    def remove_target_channel(self, group_id: str, channel: str) -> Optional[GroupSettings]:
         group = self.get_group(group_id)
         if not group:
-            return
+            return None
 
         if channel in group.target_channels:
             group.target_channels.remove(channel)
-            self.save_group(group)
\ No newline at end of file
+            self.save_group(group)
+        return group
+
+
+class AsyncDatabase:
+    # Асинхронный фасад над Database: запросы выполняются в отдельном пуле потоков,
+    # чтобы обращения к диску не блокировали цикл событий aiogram
+    def __init__(self, database: Database, max_workers: int = 4, users_batch: int = 500,
+                 users_flush_interval: float = 5.0, moderation_cache_size: int = 50000):
+        self.db = database
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+        self.users = UserDirectoryBuffer(
+            self._save_users,
+            max_batch=users_batch,
+            flush_interval=users_flush_interval
+        )
+        self._stop_word_matchers = {}
+        self._stop_words_generation = 0
+        self._groups = {}
+        self._groups_loaded = False
+        self._groups_lock = asyncio.Lock()
+        self._stale_groups = set()
+        # (user_id, group_id) -> UserViolation или None, если записи в базе нет
+        self._violations = LRUCache(moderation_cache_size)
+        # Когда базу делят несколько процессов, on_change(kind, key) сообщает им,
+        # какой кэш сбросить; kind — 'groups', 'stop_words' или 'violations'
+        self.on_change: Optional[Callable[[str, tuple], None]] = None
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _changed(self, kind: str, *key):
+        if self.on_change:
+            self.on_change(kind, key)
+
+    def apply_change(self, kind: str, key: tuple):
+        # Изменение, сделанное другим процессом: сбрасываем соответствующий кэш
+        invalidate = {
+            'groups': self.invalidate_groups,
+            'stop_words': self.invalidate_stop_words,
+            'violations': self.invalidate_violations,
+        }[kind]
+        invalidate(*key)
+
+    async def close(self):
+        await self.users.stop()
+        await self._run(self.db.close)
+        self._executor.shutdown(wait=True)
+
+    # === Методы для групп ===
+    # Настройки групп загружаются один раз и дальше читаются из памяти,
+    # все изменения записываются и в базу, и в кэш
+    async def load_groups(self):
+        async with self._groups_lock:
+            if self._groups_loaded:
+                return
+            groups = await self._run(self.db.get_all_groups)
+            self._groups = {group.group_id: group for group in groups}
+            self._stale_groups.clear()
+            self._groups_loaded = True
+
+    async def get_group(self, group_id: str) -> Optional[GroupSettings]:
+        if not self._groups_loaded:
+            await self.load_groups()
+
+        group = self._groups.get(group_id)
+        if group is None and group_id in self._stale_groups:
+            group = await self._run(self.db.get_group, group_id)
+            self._stale_groups.discard(group_id)
+            self._cache_group(group_id, group)
+        return group
+
+    def _cache_group(self, group_id: str, group: Optional[GroupSettings]):
+        if group:
+            self._groups[group_id] = group
+        else:
+            self._groups.pop(group_id, None)
+
+    def invalidate_groups(self, group_id: str = None):
+        if group_id:
+            self._groups.pop(group_id, None)
+            self._stale_groups.add(group_id)
+        else:
+            self._groups = {}
+            self._stale_groups.clear()
+            self._groups_loaded = False
+
+    async def save_group(self, group: GroupSettings):
+        await self._run(self.db.save_group, group)
+        self._cache_group(group.group_id, group)
+        self._changed('groups', group.group_id)
+
+    async def update_group_settings(self, group_id: str, **kwargs) -> Optional[GroupSettings]:
+        group = await self._run(self.db.update_group_settings, group_id, **kwargs)
+        self._cache_group(group_id, group)
+        self._changed('groups', group_id)
+        return group
+
+    # === Методы для стоп-слов ===
+    async def get_stop_words(self, group_id: str = None) -> List[StopWord]:
+        return await self._run(self.db.get_stop_words, group_id)
+
+    async def get_stop_word_matcher(self, group_id: str) -> StopWordMatcher:
+        matcher = self._stop_word_matchers.get(group_id)
+        if matcher is None:
+            generation = self._stop_words_generation
+            matcher = await self._run(self.db.build_stop_word_matcher, group_id)
+            # Набор слов мог измениться, пока автомат строился
+            if generation == self._stop_words_generation:
+                self._stop_word_matchers[group_id] = matcher
+        return matcher
+
+    def invalidate_stop_words(self, group_id: str = None):
+        # Глобальные слова входят в автомат каждой группы
+        self._stop_words_generation += 1
+        if group_id:
+            self._stop_word_matchers.pop(group_id, None)
+        else:
+            self._stop_word_matchers.clear()
+
+    async def add_stop_word(self, stop_word: StopWord):
+        await self._run(self.db.add_stop_word, stop_word)
+        group_id = stop_word.group_id if not stop_word.is_global else None
+        self.invalidate_stop_words(group_id)
+        self._changed('stop_words', group_id)
+
+    async def add_stop_words(self, words: Iterable[Tuple[str, str]], group_id: str = None) -> Tuple[int, int, int]:
+        # Разбор words тоже выполняется в потоке базы; кэш сопоставителя сбрасывается один раз
+        try:
+            return await self._run(self.db.add_stop_words, words, group_id)
+        finally:
+            self.invalidate_stop_words(group_id)
+            self._changed('stop_words', group_id)
+
+    async def export_stop_words(self, group_id: str = None) -> bytes:
+        return await self._run(self.db.export_stop_words, group_id)
+
+    async def remove_stop_word(self, word: str, group_id: str = None):
+        await self._run(self.db.remove_stop_word, word, group_id)
+        self.invalidate_stop_words(group_id)
+        self._changed('stop_words', group_id)
+
+    async def get_global_stop_words(self) -> List[StopWord]:
+        return await self._run(self.db.get_global_stop_words)
+
+    async def get_group_stop_words(self, group_id: str) -> List[StopWord]:
+        return await self._run(self.db.get_group_stop_words, group_id)
+
+    # === Методы для нарушений и банов ===
+    # Состояние модерации читается из LRU-кэша, изменения записываются и в базу, и в кэш.
+    # Возвращаемый объект общий с кэшем: после изменения его нужно сохранить.
+    # Нарушения из конвейера пишет только процесс, обслуживающий группу, поэтому
+    # другим процессам сообщается лишь о командах администратора
+    async def get_user_violations(self, user_id: int, group_id: str) -> Optional[UserViolation]:
+        key = (user_id, group_id)
+        if key in self._violations:
+            return self._violations.get(key)
+
+        violation = await self._run(self.db.get_user_violations, user_id, group_id)
+        self._violations.put(key, violation)
+        return violation
+
+    def invalidate_violations(self, user_id: int = None, group_id: str = None):
+        if user_id is None:
+            self._violations.clear()
+        else:
+            self._violations.pop((user_id, group_id))
+
+    async def save_user_violations(self, violation: UserViolation):
+        await self._run(self.db.save_user_violations, violation)
+        self._violations.put((violation.user_id, violation.group_id), violation)
+
+    async def record_violation(self, violation: UserViolation, reason: str):
+        await self._run(self.db.record_violation, violation, reason)
+        self._violations.put((violation.user_id, violation.group_id), violation)
+
+    async def ban_user(self, user_id: int, group_id: str):
+        await self._run(self.db.ban_user, user_id, group_id)
+        key = (user_id, group_id)
+        if key in self._violations:
+            violation = self._violations.get(key)
+            if violation:
+                violation.banned = True
+            else:
+                self._violations.put(key, UserViolation(user_id=user_id, group_id=group_id, banned=True))
+        self._changed('violations', user_id, group_id)
+
+    async def unban_user(self, user_id: int, group_id: str):
+        await self._run(self.db.unban_user, user_id, group_id)
+        violation = self._violations.get((user_id, group_id))
+        if violation:
+            violation.banned = False
+        self._changed('violations', user_id, group_id)
+
+    async def reset_violations(self, user_id: int, group_id: str):
+        await self._run(self.db.reset_violations, user_id, group_id)
+        self._violations.put((user_id, group_id), None)
+        self._changed('violations', user_id, group_id)
+
+    async def get_user_banned(self, user_id: int, group_id: str) -> bool:
+        violation = await self.get_user_violations(user_id, group_id)
+        return bool(violation and violation.banned)
+
+    # === Методы для медленного режима ===
+    async def get_user_message_time(self, user_id: int, group_id: str) -> Optional[UserMessage]:
+        return await self._run(self.db.get_user_message_time, user_id, group_id)
+
+    async def save_user_message_time(self, user_message: UserMessage):
+        await self._run(self.db.save_user_message_time, user_message)
+
+    # === Методы для пользователей ===
+    async def save_user(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
+        # Запись откладывается и выполняется пачкой, см. UserDirectoryBuffer
+        self.users.touch(user_id, username, first_name, last_name)
+
+    async def _save_users(self, users: List[tuple]):
+        await self._run(self.db.save_users, users)
+
+    async def get_user_by_username(self, username: str) -> Optional[dict]:
+        user = self.users.find_by_username(username)
+        if user:
+            return user
+        return await self._run(self.db.get_user_by_username, username)
+
+    # === Методы для отложенных удалений ===
+    async def get_pending_deletions(self) -> List[tuple]:
+        return await self._run(self.db.get_pending_deletions)
+
+    async def add_pending_deletions(self, rows: List[tuple]):
+        await self._run(self.db.add_pending_deletions, rows)
+
+    async def remove_pending_deletions(self, rows: List[tuple]):
+        await self._run(self.db.remove_pending_deletions, rows)
+
+    # === Обслуживание базы ===
+    async def prune(self, table: str, max_age: float, batch_size: int) -> int:
+        return await self._run(self.db.prune, table, max_age, batch_size)
+
+    async def incremental_vacuum(self, max_pages: int) -> int:
+        return await self._run(self.db.incremental_vacuum, max_pages)
+
+    async def analyze(self):
+        await self._run(self.db.analyze)
+
+    async def get_db_stats(self) -> dict:
+        return await self._run(self.db.get_db_stats)
+
+    # === Методы для каналов подписки ===
+    async def add_target_channel(self, group_id: str, channel: str) -> Optional[GroupSettings]:
+        group = await self._run(self.db.add_target_channel, group_id, channel)
+        self._cache_group(group_id, group)
+        self._changed('groups', group_id)
+        return group
+
+    async def remove_target_channel(self, group_id: str, channel: str) -> Optional[GroupSettings]:
+        group = await self._run(self.db.remove_target_channel, group_id, channel)
+        self._cache_group(group_id, group)
+        self._changed('groups', group_id)
+        return group
\ No newline at end of file
@@ -0,0 +1,322 @@
+# migrations.py
+import logging
+import sqlite3
+import time
+
+from models import UserViolation
+from utils.stop_word_matcher import normalize_wildcard
+from utils.text_normalizer import canonicalize
+
+logger = logging.getLogger(__name__)
+
+
+# Версия схемы хранится в PRAGMA user_version. Каждая миграция выполняется
+# в своей транзакции вместе с повышением версии, поэтому прерванный запуск
+# не оставляет базу в промежуточном состоянии. Новые изменения схемы
+# добавляются только в конец MIGRATIONS.
+def _ensure_column(cursor, table: str, column: str, definition: str):
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _baseline(cursor):
+    # Схема до появления миграций; для существующих баз ничего не меняет
+
+    # Таблица настроек групп
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS groups
+        (
+            group_id TEXT PRIMARY KEY,
+            group_name TEXT,
+            require_subscription BOOLEAN DEFAULT 1,
+            target_channels TEXT DEFAULT '[]',
+            slow_mode_delay INTEGER DEFAULT 15,
+            slow_mode_burst INTEGER DEFAULT 1
+        )
+    ''')
+    _ensure_column(cursor, 'groups', 'slow_mode_burst', 'INTEGER DEFAULT 1')
+
+    # Таблица стоп-слов
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stop_words
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            word TEXT NOT NULL,
+            is_global BOOLEAN DEFAULT 0,
+            group_id TEXT
+        )
+    ''')
+
+    # Таблица нарушений пользователей
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_violations
+        (
+            user_id INTEGER,
+            group_id TEXT,
+            username TEXT,
+            first_name TEXT,
+            banned BOOLEAN DEFAULT 0,
+            violations_count INTEGER DEFAULT 0,
+            last_violation_time TEXT,
+            PRIMARY KEY (user_id, group_id)
+        )
+    ''')
+
+    # Таблица времени сообщений для медленного режима
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_messages
+        (
+            user_id INTEGER,
+            group_id TEXT,
+            last_message_time TEXT,
+            PRIMARY KEY (user_id, group_id)
+        )
+    ''')
+
+    # Таблица пользователей для поиска по username
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users
+        (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            first_name TEXT,
+            last_name TEXT,
+            last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Отложенные удаления предупреждений бота, переживают перезапуск
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pending_deletions
+        (
+            chat_id INTEGER,
+            message_id INTEGER,
+            due_at REAL,
+            PRIMARY KEY (chat_id, message_id)
+        )
+    ''')
+
+
+def _stop_words_indexes(cursor):
+    # Приводим is_global к 0/1 и убираем накопившиеся дубли, оставляя самую раннюю запись
+    cursor.execute('UPDATE stop_words SET is_global = CASE WHEN is_global THEN 1 ELSE 0 END')
+    cursor.execute('''
+        DELETE FROM stop_words
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM stop_words
+            GROUP BY word, is_global, IFNULL(group_id, '')
+        )
+    ''')
+    removed = cursor.rowcount
+    if removed:
+        logger.info("Удалено дублей стоп-слов: %s", removed)
+
+    # У глобальных слов group_id = NULL, а NULL в UNIQUE не сравниваются,
+    # поэтому уникальность строится по IFNULL(group_id, '')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_stop_words_word
+        ON stop_words (word, is_global, IFNULL(group_id, ''))
+    ''')
+    # Покрывающие индексы для выборок глобальных слов и слов группы
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_stop_words_global
+        ON stop_words (is_global, word, group_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_stop_words_group
+        ON stop_words (group_id, word, is_global)
+    ''')
+
+
+def _canonical_stop_words(cursor):
+    # Стоп-слова переводятся в каноническую форму, в которой сравнивается текст сообщений
+    rows = cursor.execute('SELECT id, word, is_global, group_id FROM stop_words ORDER BY id').fetchall()
+    _replace_stop_words(cursor, [(row_id, word, is_global, group_id, canonicalize(word or ''))
+                                 for row_id, word, is_global, group_id in rows])
+
+
+def _replace_stop_words(cursor, rows):
+    # rows — (id, слово, is_global, group_id, новая форма). Слова, совпавшие после
+    # приведения с уже существующими, и пустые удаляются
+    seen = set()
+    removed = []
+    updated = []
+    for row_id, word, is_global, group_id, canonical in rows:
+        key = (canonical, is_global, group_id or '')
+        if not canonical or key in seen:
+            removed.append((row_id,))
+            continue
+        seen.add(key)
+        if canonical != word:
+            updated.append((canonical, row_id))
+
+    cursor.executemany('DELETE FROM stop_words WHERE id = ?', removed)
+    # Сначала освобождаем старые значения, чтобы не споткнуться об уникальный индекс;
+    # временное значение с невидимым символом не совпадёт ни с одной канонической формой
+    cursor.executemany('UPDATE stop_words SET word = char(8203) || id WHERE id = ?', [(row_id,) for _, row_id in updated])
+    cursor.executemany('UPDATE stop_words SET word = ? WHERE id = ?', updated)
+    if removed or updated:
+        logger.info("Стоп-слова приведены к канонической форме: изменено %s, удалено %s", len(updated), len(removed))
+
+
+# Буквы, которые прежняя таблица похожих символов переводила в кириллицу по
+# сходству заглавных, и все буквы, которые она вообще могла дать. Если в слове
+# есть латиница, такие буквы в частях с латиницей или только из этих букв
+# («виу * поw» из «buy * now»), скорее всего, латинские
+_LATIN_FOLDED = str.maketrans({'в': 'b', 'н': 'h', 'м': 'm', 'п': 'n', 'г': 'r', 'т': 't', 'и': 'u'})
+_LATIN = set('abcdefghijklmnopqrstuvwxyz')
+_FOLD_RESULTS = set('авсенкмпоргтихузчб')
+
+
+def _unfold_latin(word: str) -> str:
+    if not _LATIN & set(word):
+        return word
+    return ' '.join(token.translate(_LATIN_FOLDED) if _LATIN & set(token) or set(token) <= _FOLD_RESULTS | set('*?')
+                    else token for token in word.split(' '))
+
+
+def _homoglyph_stop_words(cursor):
+    # Слова и шаблоны пересчитываются по новой таблице похожих символов и с разложением
+    # диакритики. Исходное написание не сохранялось: «bet» хранился как «вет» и
+    # неотличим от русского слова, такие записи остаются как есть
+    rows = cursor.execute('SELECT id, word, is_global, group_id, kind FROM stop_words ORDER BY id').fetchall()
+    ambiguous = [word for _, word, _, _, kind in rows
+                 if kind != 'regex' and word and set(word) <= _FOLD_RESULTS | set(' *?')
+                 and word != word.translate(_LATIN_FOLDED)]
+    if ambiguous:
+        logger.warning("Стоп-слова, которые могли быть записаны латиницей, проверьте вручную: %s",
+                       ', '.join(ambiguous[:20]) + (' ...' if len(ambiguous) > 20 else ''))
+    forms = {'word': canonicalize, 'wildcard': normalize_wildcard}
+    # Регулярные выражения не меняются, но участвуют в проверке уникальности
+    _replace_stop_words(cursor, [
+        (row_id, word, is_global, group_id,
+         forms[kind](_unfold_latin(word or '')) if kind in forms else word)
+        for row_id, word, is_global, group_id, kind in rows
+    ])
+
+
+def _stop_word_originals(cursor):
+    # Написание стоп-слова, как его ввёл администратор, для списков и экспорта.
+    # У записей, добавленных раньше, его нет, показывается каноническая форма
+    _ensure_column(cursor, 'stop_words', 'original', 'TEXT')
+
+
+def _stop_word_kinds(cursor):
+    # Тип стоп-слова: подстрока, шаблон со * и ? или регулярное выражение.
+    # Покрывающие индексы пересоздаются вместе с новой колонкой
+    _ensure_column(cursor, 'stop_words', 'kind', "TEXT NOT NULL DEFAULT 'word'")
+    cursor.execute('DROP INDEX IF EXISTS idx_stop_words_global')
+    cursor.execute('DROP INDEX IF EXISTS idx_stop_words_group')
+    cursor.execute('''
+        CREATE INDEX idx_stop_words_global
+        ON stop_words (is_global, word, group_id, kind)
+    ''')
+    cursor.execute('''
+        CREATE INDEX idx_stop_words_group
+        ON stop_words (group_id, word, is_global, kind)
+    ''')
+
+
+def _violation_scores(cursor):
+    # История нарушений и затухающий счёт вместо вечного счётчика
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS violation_events
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            reason TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_violation_events_user
+        ON violation_events (group_id, user_id, ts)
+    ''')
+    _ensure_column(cursor, 'user_violations', 'score', 'REAL DEFAULT 0')
+    _ensure_column(cursor, 'user_violations', 'score_updated_at', 'REAL')
+    _ensure_column(cursor, 'user_violations', 'blocked_until', 'REAL')
+    _ensure_column(cursor, 'groups', 'violation_half_life', 'INTEGER DEFAULT 86400')
+    _ensure_column(cursor, 'groups', 'violation_threshold', 'INTEGER DEFAULT 5')
+    # Накопленные нарушения становятся начальным счётом и дальше затухают.
+    # Кто уже был заблокирован за 5 нарушений, остаётся заблокирован на время затухания
+    now = time.time()
+    rows = cursor.execute('SELECT user_id, group_id, violations_count FROM user_violations '
+                          'WHERE violations_count > 0').fetchall()
+    updates = []
+    for user_id, group_id, count in rows:
+        violation = UserViolation(user_id=user_id, group_id=group_id, score=count - 1, score_updated_at=now)
+        violation.add_violation(86400, 5, now)
+        updates.append((violation.score, now, violation.blocked_until, user_id, group_id))
+    cursor.executemany('''
+        UPDATE user_violations SET score = ?, score_updated_at = ?, blocked_until = ?
+        WHERE user_id = ? AND group_id = ?
+    ''', updates)
+
+
+def _retention_indexes(cursor):
+    # Индексы, по которым фоновое обслуживание находит устаревшие строки.
+    # violation_events удаляется по возрастанию id, отдельный индекс не нужен
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users (last_seen)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_messages_time ON user_messages (last_message_time)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_violations_score_time
+        ON user_violations (score_updated_at)
+    ''')
+
+
+MIGRATIONS = [
+    (1, 'базовая схема', _baseline),
+    (2, 'уникальность и индексы стоп-слов', _stop_words_indexes),
+    (3, 'каноническая форма стоп-слов', _canonical_stop_words),
+    (4, 'шаблоны и регулярные выражения в стоп-словах', _stop_word_kinds),
+    (5, 'история и затухающий счёт нарушений', _violation_scores),
+    (6, 'индексы для очистки устаревших данных', _retention_indexes),
+    (7, 'стоп-слова по новой таблице похожих символов', _homoglyph_stop_words),
+    (8, 'исходное написание стоп-слов', _stop_word_originals),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _ensure_incremental_vacuum(conn: sqlite3.Connection):
+    # Освобождённые страницы возвращаются файлу через PRAGMA incremental_vacuum.
+    # Новой базе режим задаётся при подключении, до WAL и создания таблиц;
+    # существующую один раз перестраивает VACUUM
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return
+    conn.commit()
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    logger.info("Перестройка файла базы для инкрементальной очистки, выполняется один раз")
+    conn.execute('VACUUM')
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        logger.warning("⚠️ Не удалось включить инкрементальную очистку базы")
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    _ensure_incremental_vacuum(conn)
+    version = get_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Версия схемы базы ({version}) новее, чем поддерживает бот ({SCHEMA_VERSION})")
+
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            apply(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("❌ Ошибка миграции схемы до версии %s", target)
+            raise
+        logger.info("Схема базы обновлена до версии %s: %s", target, description)
+        version = target
+    return version
@@ -10,6 +10,11 @@ class GroupSettings:
     require_subscription: bool = True
     target_channels: List[str] = None
     slow_mode_delay: int = 15
+    slow_mode_burst: int = 1
+    # Счёт нарушений вдвое уменьшается за violation_half_life секунд (0 — не уменьшается),
+    # при счёте от violation_threshold сообщения пользователя удаляются, пока он не затухнет
+    violation_half_life: int = 86400
+    violation_threshold: int = 5
 
     def __post_init__(self):
         if self.target_channels is None:
@@ -22,6 +27,9 @@ class GroupSettings:
             "require_subscription": self.require_subscription,
             "target_channels": json.dumps(self.target_channels),
             "slow_mode_delay": self.slow_mode_delay,
+            "slow_mode_burst": self.slow_mode_burst,
+            "violation_half_life": self.violation_half_life,
+            "violation_threshold": self.violation_threshold,
         }
 
     @classmethod
@@ -34,4 +42,7 @@ class GroupSettings:
             require_subscription=bool(data["require_subscription"]),
             target_channels=json.loads(data["target_channels"]) if data["target_channels"] else [],
             slow_mode_delay=data["slow_mode_delay"],
+            slow_mode_burst=data.get("slow_mode_burst") or 1,
+            violation_half_life=data.get("violation_half_life", 86400),
+            violation_threshold=data.get("violation_threshold") or 5,
         )
\ No newline at end of file
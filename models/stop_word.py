@@ -2,17 +2,22 @@ from dataclasses import dataclass
 from typing import Optional
 
 
+# kind: 'word' — подстрока, 'wildcard' — шаблон со * и ?, 'regex' — регулярное выражение.
+# word хранится в канонической форме, original — как его ввёл администратор
 @dataclass
 class StopWord:
     word: str
     is_global: bool = True
     group_id: Optional[str] = None
+    kind: str = 'word'
+    original: Optional[str] = None
 
     def to_dict(self):
         return {
-            'word': self.word.lower(),
+            'word': self.word if self.kind == 'regex' else self.word.lower(),
             'is_global': self.is_global,
-            'group_id': self.group_id
+            'group_id': self.group_id,
+            'kind': self.kind
         }
 
     @classmethod
@@ -23,5 +28,7 @@ class StopWord:
         return cls(
             word=data['word'],
             is_global=bool(data['is_global']),
-            group_id=data['group_id']
+            group_id=data['group_id'],
+            kind=data.get('kind') or 'word',
+            original=data.get('original')
         )
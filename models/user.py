@@ -1,3 +1,5 @@
+import math
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
@@ -12,6 +14,36 @@ class UserViolation:
     banned: bool = False
     violations_count: int = 0
     last_violation_time: Optional[str] = None
+    # Затухающий счёт нарушений и время (unix), на которое он посчитан
+    score: float = 0.0
+    score_updated_at: Optional[float] = None
+    # До какого времени (unix) удаляются все сообщения пользователя
+    blocked_until: Optional[float] = None
+
+    def current_score(self, half_life: float, now: float = None) -> float:
+        # За half_life секунд счёт уменьшается вдвое; half_life <= 0 — без затухания
+        if not self.score or not self.score_updated_at or half_life <= 0:
+            return self.score
+        now = time.time() if now is None else now
+        return self.score * 0.5 ** (max(0.0, now - self.score_updated_at) / half_life)
+
+    def add_violation(self, half_life: float, threshold: int, now: float = None, weight: float = 1.0) -> bool:
+        # Возвращает True, если счёт дошёл до порога. Тогда пользователь заблокирован,
+        # пока счёт не затухнет до половины порога; без затухания — бессрочно
+        now = time.time() if now is None else now
+        self.score = self.current_score(half_life, now) + weight
+        self.score_updated_at = now
+        self.violations_count += 1
+        self.last_violation_time = datetime.fromtimestamp(now).isoformat()
+        # Порог — число нарушений, счёт сравнивается с ним после округления:
+        # пять нарушений подряд дают не ровно 5 из-за затухания между ними
+        if self.score + 0.5 < threshold:
+            return False
+        self.blocked_until = now + half_life * math.log2(2 * self.score / threshold) if half_life > 0 else math.inf
+        return True
+
+    def is_blocked(self, now: float = None) -> bool:
+        return self.blocked_until is not None and self.blocked_until > (time.time() if now is None else now)
 
     def to_dict(self):
         return {
@@ -22,6 +54,9 @@ class UserViolation:
             "banned": self.banned,
             "violations_count": self.violations_count,
             "last_violation_time": self.last_violation_time,
+            "score": self.score,
+            "score_updated_at": self.score_updated_at,
+            "blocked_until": self.blocked_until,
         }
 
     @classmethod
@@ -36,6 +71,9 @@ class UserViolation:
             banned=data["banned"],
             violations_count=data["violations_count"],
             last_violation_time=data["last_violation_time"],
+            score=data.get("score") or 0.0,
+            score_updated_at=data.get("score_updated_at"),
+            blocked_until=data.get("blocked_until"),
         )
 
 
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import Update
+
+from database import AsyncDatabase
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать готовности воркеров при старте и их завершения при остановке, сек
+START_TIMEOUT = 60
+STOP_TIMEOUT = 15
+
+
+def shard_for(chat_id: int, shards: int) -> int:
+    return chat_id % shards
+
+
+def update_chat_id(update: dict) -> int:
+    # Чат, к которому относится обновление; для обновлений без чата — отправитель
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        sender = event.get("from") or event.get("user")
+        if sender:
+            return sender["id"]
+    return 0
+
+
+# Фронтальный процесс: получает обновления (polling или webhook) и раздаёт их
+# воркерам по chat_id, так что все обновления одного чата попадают в один процесс
+# и идут в исходном порядке, а разные группы обрабатываются параллельно.
+# Через него же воркеры рассылают друг другу сбросы кэшей после команд администратора.
+class ShardedFrontend:
+    def __init__(self, worker_target: Callable, shards: int, worker_args: tuple = ()):
+        # worker_target(index, shards, updates, events, *worker_args) выполняется в новом процессе
+        self.worker_target = worker_target
+        self.shards = shards
+        self.worker_args = worker_args
+        self._context = multiprocessing.get_context("spawn")
+        self._updates: List[multiprocessing.Queue] = []
+        self._events: Optional[multiprocessing.Queue] = None
+        self._processes: List[multiprocessing.Process] = []
+        self._relay: Optional[asyncio.Task] = None
+
+    async def start(self) -> List[str]:
+        # Запускает воркеры и возвращает типы обновлений, которые они обрабатывают
+        self._events = self._context.Queue()
+        for index in range(self.shards):
+            updates = self._context.Queue()
+            process = self._context.Process(
+                target=self.worker_target,
+                args=(index, self.shards, updates, self._events) + tuple(self.worker_args),
+                name=f"worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self._updates.append(updates)
+            self._processes.append(process)
+
+        update_types = set()
+        loop = asyncio.get_running_loop()
+        for _ in range(self.shards):
+            index, kind, payload = await loop.run_in_executor(None, self._events.get, True, START_TIMEOUT)
+            if kind != "ready":
+                raise RuntimeError(f"Неожиданное сообщение от воркера {index} при запуске: {kind}")
+            update_types.update(payload)
+
+        self._relay = asyncio.create_task(self._relay_events())
+        logger.info("Запущено воркеров: %s", self.shards)
+        return sorted(update_types)
+
+    def route(self, update: dict):
+        shard = shard_for(update_chat_id(update), self.shards)
+        self._updates[shard].put_nowait(("update", update))
+
+    async def _relay_events(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                origin, kind, payload = await loop.run_in_executor(None, self._events.get, True, 1.0)
+            except queue.Empty:
+                continue
+            for index, updates in enumerate(self._updates):
+                if index != origin:
+                    updates.put_nowait(("invalidate", kind, payload))
+
+    async def stop(self):
+        if self._relay is not None:
+            self._relay.cancel()
+            try:
+                await self._relay
+            except asyncio.CancelledError:
+                pass
+            self._relay = None
+
+        for updates in self._updates:
+            updates.put_nowait(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning("Воркер %s не завершился вовремя, останавливаем принудительно", process.name)
+                process.terminate()
+        # Не ждём при выходе сообщений, которые уже некому прочитать
+        for channel in self._updates + ([self._events] if self._events else []):
+            channel.close()
+            channel.cancel_join_thread()
+        self._processes.clear()
+        self._updates.clear()
+
+
+# Вместо обработки во фронтальном процессе обновление отправляется воркеру
+class ShardMiddleware(BaseMiddleware):
+    def __init__(self, frontend: ShardedFrontend):
+        self.frontend = frontend
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Update,
+                       data: Dict[str, Any]) -> Any:
+        # by_alias: ключи как в Bot API ("from", а не "from_user"), их ждут update_chat_id и воркер
+        self.frontend.route(event.model_dump(mode="json", exclude_none=True, by_alias=True))
+        return True
+
+
+def _receive(updates: multiprocessing.Queue, max_batch: int = 500) -> list:
+    # Забираем всё накопившееся за один переход в поток, а не по одному сообщению
+    batch = [updates.get()]
+    while len(batch) < max_batch:
+        try:
+            batch.append(updates.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+# Цикл воркера: обновления из очереди передаются в его Dispatcher,
+# сбросы кэшей от других воркеров применяются к его AsyncDatabase
+async def serve_worker(bot: Bot, dp: Dispatcher, db: AsyncDatabase, index: int,
+                       updates: multiprocessing.Queue, events: multiprocessing.Queue):
+    db.on_change = lambda kind, key: events.put_nowait((index, kind, key))
+    events.put_nowait((index, "ready", dp.resolve_used_update_types()))
+
+    tasks = set()
+    loop = asyncio.get_running_loop()
+
+    async def process(update: dict):
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logger.exception("❌ Ошибка обработки обновления")
+
+    running = True
+    while running:
+        for message in await loop.run_in_executor(None, _receive, updates):
+            if message is None:
+                running = False
+                break
+            if message[0] == "invalidate":
+                _, kind, key = message
+                db.apply_change(kind, key)
+                continue
+
+            task = asyncio.create_task(process(message[1]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
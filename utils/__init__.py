@@ -1,3 +1,18 @@
+from .admin_roster import AdminRoster
+from .chat_ordering import ChatOrderingMiddleware
+from .db_maintenance import DatabaseMaintenance
+from .deletion_scheduler import DeletionScheduler
 from .helpers import Helpers
+from .logger import setup_logging
+from .lru_cache import LRUCache
+from .outbound import OutboundQueue
+from .raid_detector import RaidDetector
+from .rate_limiter import SlowModeLimiter
+from .stop_word_io import read_stop_words, write_stop_words
+from .stop_word_matcher import StopWordMatcher, normalize_stop_word
+from .subscription_cache import SubscriptionCache
+from .text_normalizer import canonicalize
+from .user_directory import UserDirectoryBuffer
+from .warning_coalescer import WarningCoalescer
 
-__all__ = ['Helpers']
\ No newline at end of file
+__all__ = ['AdminRoster', 'ChatOrderingMiddleware', 'DatabaseMaintenance', 'DeletionScheduler', 'Helpers', 'LRUCache', 'OutboundQueue', 'RaidDetector', 'SlowModeLimiter', 'StopWordMatcher', 'SubscriptionCache', 'UserDirectoryBuffer', 'WarningCoalescer', 'canonicalize', 'normalize_stop_word', 'read_stop_words', 'setup_logging', 'write_stop_words']
\ No newline at end of file
@@ -0,0 +1,81 @@
+import logging
+import time
+from typing import Dict, Set, Tuple
+
+from aiogram import types
+
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = ('administrator', 'creator')
+
+
+# Кэш списков администраторов групп: проверка прав в командах не обращается к API.
+# Список обновляется по TTL и точечно по обновлениям chat_member, одновременные
+# обновления одного чата ждут общий вызов getChatAdministrators. Когда меняется
+# статус самого бота в чате, список сбрасывается целиком.
+class AdminRoster:
+    def __init__(self, bot, ttl: float = 600, max_chats: int = 10000):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_chats = max_chats
+        # chat_id -> (id администраторов, expires_at)
+        self._rosters: Dict[int, Tuple[Set[int], float]] = {}
+        self._fetches = SingleFlight()
+
+    async def is_admin(self, chat_id: int, user_id: int) -> bool:
+        return user_id in await self.get_admins(chat_id)
+
+    async def get_admins(self, chat_id: int) -> Set[int]:
+        cached = self._rosters.get(chat_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        return await self._fetches.run(chat_id, lambda: self._fetch(chat_id))
+
+    async def _fetch(self, chat_id: int) -> Set[int]:
+        try:
+            administrators = await self.bot.get_chat_administrators(chat_id)
+        except Exception as e:
+            # Ошибку не кэшируем; пока API недоступен, действуют прежние данные, если они были
+            logger.warning("Ошибка получения администраторов чата %s: %s", chat_id, e)
+            cached = self._rosters.get(chat_id)
+            return cached[0] if cached else set()
+
+        admins = {member.user.id for member in administrators}
+        self._store(chat_id, admins)
+        return admins
+
+    def _store(self, chat_id: int, admins: Set[int]):
+        if chat_id not in self._rosters and len(self._rosters) >= self.max_chats:
+            # Вытесняем самый старый список
+            del self._rosters[next(iter(self._rosters))]
+        self._rosters[chat_id] = (admins, time.monotonic() + self.ttl)
+
+    async def on_chat_member(self, update: types.ChatMemberUpdated):
+        # Назначение и снятие администратора меняют кэш без запроса к API
+        cached = self._rosters.get(update.chat.id)
+        if cached is None:
+            return
+
+        user_id = update.new_chat_member.user.id
+        if update.new_chat_member.status in ADMIN_STATUSES:
+            cached[0].add(user_id)
+        else:
+            cached[0].discard(user_id)
+
+    async def on_my_chat_member(self, update: types.ChatMemberUpdated):
+        # Без прав администратора бот не получает chat_member, и список мог устареть;
+        # после удаления из чата он и вовсе не нужен
+        self.invalidate(update.chat.id)
+
+    def invalidate(self, chat_id: int = None):
+        if chat_id is None:
+            self._rosters.clear()
+        else:
+            self._rosters.pop(chat_id, None)
+
+    def register_handlers(self, dp):
+        dp.chat_member.register(self.on_chat_member)
+        dp.my_chat_member.register(self.on_my_chat_member)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from .metrics import CHAT_QUEUE_DEPTH, DISPATCH_IN_PROGRESS, DISPATCH_WAIT
+
+
+class _Lane:
+    __slots__ = ('lock', 'depth')
+
+    def __init__(self):
+        # asyncio.Lock будит ожидающих в порядке очереди, это и сохраняет порядок обновлений
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+# Упорядоченная обработка обновлений: внутри одного чата (или пары чат-пользователь
+# при mode="chat_user") обновления обрабатываются строго по очереди, а разные чаты —
+# параллельно, но не больше max_concurrency одновременно. Слот пула занимается
+# только когда подошла очередь чата, так что занятый чат не держит чужие обновления.
+class ChatOrderingMiddleware(BaseMiddleware):
+    def __init__(self, max_concurrency: int = 100, mode: str = "chat"):
+        if mode not in ("chat", "chat_user"):
+            raise ValueError(f"Неизвестный режим упорядочивания: {mode}")
+        self.mode = mode
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._lanes: Dict[Hashable, _Lane] = {}
+        # chat_id -> сколько обновлений чата ждут или обрабатываются
+        self._depths: Dict[int, int] = {}
+        self._in_progress = 0
+
+    def depth(self, chat_id: int) -> int:
+        return self._depths.get(chat_id, 0)
+
+    def _key(self, update: Update) -> Optional[tuple]:
+        event = update.event
+        chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+        user = getattr(event, "from_user", None)
+        if chat is None:
+            if user is None:
+                return None
+            return (user.id, None)
+        if self.mode == "chat_user" and user is not None:
+            return (chat.id, user.id)
+        return (chat.id, None)
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]], update: Update,
+                       data: Dict[str, Any]) -> Any:
+        key = self._key(update)
+        if key is None:
+            async with self._slots:
+                return await handler(update, data)
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        lane.depth += 1
+        self._track(key[0], 1)
+        queued_at = time.perf_counter()
+        try:
+            async with lane.lock:
+                async with self._slots:
+                    DISPATCH_WAIT.observe(time.perf_counter() - queued_at)
+                    self._in_progress += 1
+                    DISPATCH_IN_PROGRESS.set(self._in_progress)
+                    try:
+                        return await handler(update, data)
+                    finally:
+                        self._in_progress -= 1
+                        DISPATCH_IN_PROGRESS.set(self._in_progress)
+        finally:
+            lane.depth -= 1
+            if lane.depth == 0:
+                del self._lanes[key]
+            self._track(key[0], -1)
+
+    def _track(self, chat_id: int, delta: int):
+        depth = self._depths.get(chat_id, 0) + delta
+        if depth:
+            self._depths[chat_id] = depth
+            CHAT_QUEUE_DEPTH.set(depth, chat_id)
+        else:
+            self._depths.pop(chat_id, None)
+            CHAT_QUEUE_DEPTH.remove(chat_id)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from .metrics import DB_PRUNED_ROWS, DB_RECLAIMED_PAGES
+
+logger = logging.getLogger(__name__)
+
+
+# Фоновое обслуживание базы: удаление устаревших строк, возврат освободившихся
+# страниц файлу и обновление статистики планировщика запросов. Строки удаляются
+# пачками по batch_size, каждая пачка — отдельная короткая транзакция с паузой
+# после неё, так что запись модерации не ждёт дольше одной пачки.
+class DatabaseMaintenance:
+    def __init__(self, db, retention: Dict[str, float], interval: float = 3600.0, batch_size: int = 500,
+                 batch_pause: float = 0.05, vacuum_pages: int = 1000, start_delay: float = 60.0):
+        # retention: таблица -> срок хранения в секундах, 0 — хранить всегда
+        self.db = db
+        self.retention = retention
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.vacuum_pages = vacuum_pages
+        self.start_delay = start_delay
+        self.last_report: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run_periodically())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_periodically(self):
+        await asyncio.sleep(min(self.start_delay, self.interval))
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("❌ Ошибка обслуживания базы")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> dict:
+        started = time.monotonic()
+        report = {'finished_at': None, 'duration': 0.0, 'pruned': {}, 'reclaimed_pages': 0}
+
+        for table, max_age in self.retention.items():
+            if not max_age:
+                continue
+            pruned = 0
+            while True:
+                removed = await self.db.prune(table, max_age, self.batch_size)
+                pruned += removed
+                if removed < self.batch_size:
+                    break
+                await asyncio.sleep(self.batch_pause)
+            report['pruned'][table] = pruned
+            if pruned:
+                DB_PRUNED_ROWS.inc(table, amount=pruned)
+
+        while True:
+            reclaimed = await self.db.incremental_vacuum(self.vacuum_pages)
+            report['reclaimed_pages'] += reclaimed
+            if reclaimed < self.vacuum_pages:
+                break
+            await asyncio.sleep(self.batch_pause)
+        DB_RECLAIMED_PAGES.inc(amount=report['reclaimed_pages'])
+
+        await self.db.analyze()
+
+        report['duration'] = time.monotonic() - started
+        report['finished_at'] = time.time()
+        self.last_report = report
+        logger.info("🧹 Обслуживание базы: удалено строк %s, возвращено страниц %s за %.1f сек",
+                    sum(report['pruned'].values()), report['reclaimed_pages'], report['duration'])
+        return report
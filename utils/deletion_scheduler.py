@@ -0,0 +1,118 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Единый планировщик удаления временных сообщений (предупреждений бота).
+# Вместо отдельной спящей задачи на каждое предупреждение — одна куча и один таймер.
+# Отложенные удаления сохраняются в базу пачками и переживают перезапуск,
+# а удаления одного чата, наступившие одновременно, уходят одним вызовом.
+class DeletionScheduler:
+    def __init__(self, delete_func: Callable[[int, List[int]], None] = None,
+                 save_func: Callable[[List[tuple]], Awaitable[None]] = None,
+                 remove_func: Callable[[List[tuple]], Awaitable[None]] = None,
+                 flush_interval: float = 5.0):
+        self.delete_func = delete_func
+        self.save_func = save_func
+        self.remove_func = remove_func
+        self.flush_interval = flush_interval
+        # (время удаления по time.time(), chat_id, message_id)
+        self._heap: List[Tuple[float, int, int]] = []
+        # (chat_id, message_id) -> актуальное время удаления; устаревшие записи кучи пропускаются
+        self._due: Dict[Tuple[int, int], float] = {}
+        self._to_save: List[tuple] = []
+        self._to_remove: List[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._due)
+
+    def load(self, rows: List[tuple]):
+        # rows: [(chat_id, message_id, due_at), ...] из базы; просроченные удалятся сразу
+        for chat_id, message_id, due_at in rows:
+            self._due[(chat_id, message_id)] = due_at
+            heapq.heappush(self._heap, (due_at, chat_id, message_id))
+        self._notify()
+
+    def schedule(self, chat_id: int, message_id: int, delay: float):
+        # Повторный вызов для того же сообщения переносит его удаление
+        due_at = time.time() + delay
+        self._due[(chat_id, message_id)] = due_at
+        heapq.heappush(self._heap, (due_at, chat_id, message_id))
+        self._to_save.append((chat_id, message_id, due_at))
+        # Таймер нужно перевзвести, только если новое удаление стало ближайшим
+        if self._task is None or self._heap[0][0] == due_at:
+            self._notify()
+
+    def schedule_when_sent(self, future: asyncio.Future, chat_id: int, delay: float):
+        # future из OutboundQueue.send_message: удаление планируется, когда сообщение отправлено
+        def on_sent(done: asyncio.Future):
+            message = done.result()
+            if message is not None:
+                self.schedule(chat_id, message.message_id, delay)
+
+        future.add_done_callback(on_sent)
+
+    def _notify(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    def _fire_due(self, now: float):
+        due: Dict[int, List[int]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            due_at, chat_id, message_id = heapq.heappop(self._heap)
+            if self._due.get((chat_id, message_id)) != due_at:
+                continue
+            del self._due[(chat_id, message_id)]
+            due.setdefault(chat_id, []).append(message_id)
+
+        for chat_id, message_ids in due.items():
+            self.delete_func(chat_id, message_ids)
+            self._to_remove.extend((chat_id, message_id) for message_id in message_ids)
+
+    async def _flush(self):
+        to_save, self._to_save = self._to_save, []
+        to_remove, self._to_remove = self._to_remove, []
+        try:
+            if to_save and self.save_func:
+                await self.save_func(to_save)
+            if to_remove and self.remove_func:
+                await self.remove_func(to_remove)
+        except Exception as e:
+            logger.error("Ошибка сохранения отложенных удалений: %s", e)
+            self._to_save[:0] = to_save
+            self._to_remove[:0] = to_remove
+
+    async def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            self._wakeup.clear()
+            timeout = self.flush_interval
+            if self._heap:
+                timeout = min(timeout, max(0.0, self._heap[0][0] - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            self._fire_due(time.time())
+            if time.monotonic() - last_flush >= self.flush_interval:
+                last_flush = time.monotonic()
+                await self._flush()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._fire_due(time.time())
+        await self._flush()
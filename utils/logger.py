@@ -0,0 +1,85 @@
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Dict, Optional
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+# Ограничение частоты повторяющихся событий. Срабатывает только для записей,
+# помеченных extra={'rate_limit': True}; ключ — шаблон сообщения, а не готовый текст
+class RateLimitFilter(logging.Filter):
+    def __init__(self, max_per_interval: int = 10, interval: float = 60.0):
+        super().__init__()
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        # (logger, шаблон) -> [начало окна, пропущено, выведено]
+        self._windows: Dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'rate_limit', False):
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[1] if window else 0
+            self._windows[key] = [now, 0, 1]
+            if suppressed:
+                record.msg = f"{record.msg} (пропущено похожих: {suppressed})"
+            return True
+
+        if window[2] >= self.max_per_interval:
+            window[1] += 1
+            return False
+        window[2] += 1
+        return True
+
+
+# В отличие от стандартного QueueHandler не форматирует запись в вызывающем потоке:
+# вся работа с текстом и выводом выполняется в потоке QueueListener
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(level: str = "INFO", module_levels: Optional[Dict[str, str]] = None,
+                  json_output: bool = False, rate_limit: int = 10,
+                  rate_limit_interval: float = 60.0) -> logging.handlers.QueueListener:
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if json_output:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_limit, rate_limit_interval))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
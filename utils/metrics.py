@@ -0,0 +1,201 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        key = tuple(str(value) for value in label_values)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self._values.get(tuple(str(value) for value in label_values), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *label_values):
+        self._values[tuple(str(label) for label in label_values)] = value
+
+    def remove(self, *label_values):
+        # Серия пропадает из выдачи, например когда очередь чата опустела
+        self._values.pop(tuple(str(label) for label in label_values), None)
+
+    def get(self, *label_values) -> float:
+        return self._values.get(tuple(str(value) for value in label_values), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счётчики по корзинам (последняя +Inf), сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values):
+        key = tuple(str(label) for label in label_values)
+        data = self._values.get(key)
+        if data is None:
+            data = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+        data[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.register(Histogram(
+    "tg_moderation_stage_seconds", "Время этапов обработки сообщения", ["stage"]
+))
+MESSAGE_LATENCY = registry.register(Histogram(
+    "tg_moderation_message_seconds", "Полное время обработки сообщения", ["outcome"]
+))
+MESSAGES = registry.register(Counter(
+    "tg_moderation_messages_total", "Обработанные сообщения по группам и результатам", ["group_id", "outcome"]
+))
+API_LATENCY = registry.register(Histogram(
+    "tg_api_request_seconds", "Время запросов к Bot API", ["method", "outcome"]
+))
+OUTBOUND_ACTIONS = registry.register(Counter(
+    "tg_outbound_actions_total", "Действия очереди исходящих запросов", ["kind", "outcome"]
+))
+CHAT_QUEUE_DEPTH = registry.register(Gauge(
+    "tg_dispatch_chat_queue_depth", "Обновления чата в очереди и в обработке (только непустые очереди)", ["chat_id"]
+))
+DISPATCH_IN_PROGRESS = registry.register(Gauge(
+    "tg_dispatch_in_progress", "Обновления, обрабатываемые прямо сейчас"
+))
+DISPATCH_WAIT = registry.register(Histogram(
+    "tg_dispatch_wait_seconds", "Ожидание обновления в очереди чата и пула обработчиков"
+))
+WARNINGS = registry.register(Counter(
+    "tg_moderation_warnings_total", "Предупреждения: отправленные, склеенные и отредактированные", ["reason", "outcome"]
+))
+DB_PRUNED_ROWS = registry.register(Counter(
+    "tg_db_pruned_rows_total", "Строки, удалённые фоновым обслуживанием базы по сроку хранения", ["table"]
+))
+DB_RECLAIMED_PAGES = registry.register(Counter(
+    "tg_db_reclaimed_pages_total", "Страницы, возвращённые файлу базы инкрементальной очисткой"
+))
+
+
+# Замеряет каждый исходящий запрос к Bot API: метод и результат (ok, flood_wait, error)
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        api_method = getattr(method, "__api_method__", type(method).__name__)
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            outcome = "flood_wait"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - start, api_method, outcome)
+
+
+class MetricsServer:
+    def __init__(self, metrics: MetricsRegistry = registry, path: str = "/metrics"):
+        self.metrics = metrics
+        self.app = web.Application()
+        self.app.router.add_get(path, self.handle)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=self.metrics.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    async def start(self, host: str, port: int):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from .deletion_scheduler import DeletionScheduler
+from .metrics import OUTBOUND_ACTIONS
+
+logger = logging.getLogger(__name__)
+
+# Bot API удаляет не больше 100 сообщений за один вызов deleteMessages
+MAX_DELETE_BATCH = 100
+# Как часто забываются чаты без недавних отправок и истёкшие блокировки, сек
+PRUNE_INTERVAL = 60.0
+
+
+class _Bucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _SendWindow:
+    # Скользящее окно: не больше limit отправок за любые period секунд.
+    # В отличие от ведра токенов, не даёт в первую минуту двойного запаса
+    __slots__ = ('limit', 'period', 'sent')
+
+    def __init__(self, limit: int, period: float = 60.0):
+        self.limit = limit
+        self.period = period
+        self.sent: deque = deque()
+
+    def _expire(self, now: float):
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+
+    def wait_time(self, now: float) -> float:
+        self._expire(now)
+        return 0.0 if len(self.sent) < self.limit else self.sent[0] + self.period - now
+
+    def take(self, now: float):
+        self.sent.append(now)
+
+    def idle(self, now: float) -> bool:
+        self._expire(now)
+        return not self.sent
+
+
+class _SendAction:
+    __slots__ = ('chat_id', 'factory', 'future', 'created_at', 'kind')
+
+    def __init__(self, chat_id: int, factory: Callable[[], Awaitable], kind: str):
+        self.chat_id = chat_id
+        self.factory = factory
+        self.future = asyncio.get_running_loop().create_future()
+        self.created_at = time.monotonic()
+        self.kind = kind
+
+
+# Очередь исходящих действий модерации с учётом лимитов Telegram.
+# Удаления идут раньше предупреждений и склеиваются в deleteMessages по чату,
+# отправка сообщений ограничена бюджетом на чат, а retry_after блокирует чат
+# до истечения ожидания. Конвейер модерации только ставит действия в очередь.
+class OutboundQueue:
+    def __init__(self, bot, global_rate: float = 25, chat_messages_per_minute: int = 20,
+                 max_in_flight: int = 10, send_ttl: float = 30.0, deletions: DeletionScheduler = None):
+        self.bot = bot
+        # Удаления по таймеру (delete_after) ведёт один общий планировщик
+        self.deletions = deletions if deletions is not None else DeletionScheduler()
+        self.deletions.delete_func = self.delete_many
+        self.send_ttl = send_ttl
+        self.chat_messages_per_minute = chat_messages_per_minute
+        # Небольшой запас ведра, чтобы за любую секунду не выйти заметно за global_rate
+        self._global = _Bucket(global_rate, max(1.0, global_rate / 5))
+        self._chat_budgets: Dict[int, _SendWindow] = {}
+        # (chat_id, 'delete' | 'send') -> monotonic-время окончания flood wait
+        self._blocked_until: Dict[tuple, float] = {}
+        self._pruned_at = time.monotonic()
+        self._deletes: "OrderedDict[int, List[int]]" = OrderedDict()
+        self._sends: deque = deque()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return sum(len(ids) for ids in self._deletes.values()) + len(self._sends)
+
+    # === Постановка в очередь ===
+    def delete(self, chat_id: int, message_id: int):
+        self._deletes.setdefault(chat_id, []).append(message_id)
+        self._notify()
+
+    def delete_many(self, chat_id: int, message_ids: List[int]):
+        self._deletes.setdefault(chat_id, []).extend(message_ids)
+        self._notify()
+
+    def send_message(self, chat_id: int, text: str, delete_after: float = None, **kwargs) -> asyncio.Future:
+        future = self._enqueue_send(chat_id, lambda: self.bot.send_message(chat_id, text, **kwargs), 'send')
+        if delete_after:
+            self.deletions.schedule_when_sent(future, chat_id, delete_after)
+        return future
+
+    def edit_message_text(self, chat_id: int, message_id: int, text: str, **kwargs) -> asyncio.Future:
+        return self._enqueue_send(
+            chat_id,
+            lambda: self.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs),
+            'edit'
+        )
+
+    def _enqueue_send(self, chat_id: int, factory, kind: str) -> asyncio.Future:
+        action = _SendAction(chat_id, factory, kind)
+        self._sends.append(action)
+        self._notify()
+        return action.future
+
+    def _notify(self):
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    # === Выбор следующего действия ===
+    def _chat_budget(self, chat_id: int) -> _SendWindow:
+        budget = self._chat_budgets.get(chat_id)
+        if budget is None:
+            budget = self._chat_budgets[chat_id] = _SendWindow(self.chat_messages_per_minute)
+        return budget
+
+    def _prune(self, now: float):
+        # Окна и блокировки нужны только недавно активным чатам
+        self._pruned_at = now
+        for chat_id in [chat_id for chat_id, budget in self._chat_budgets.items() if budget.idle(now)]:
+            del self._chat_budgets[chat_id]
+        for key in [key for key, until in self._blocked_until.items() if until <= now]:
+            del self._blocked_until[key]
+
+    def _next_action(self, now: float):
+        # Возвращает (действие, None) или (None, через сколько секунд что-то станет доступно)
+        wait = None
+        for chat_id in self._deletes:
+            blocked = self._blocked_until.get((chat_id, 'delete'), 0) - now
+            if blocked <= 0:
+                ids = self._deletes[chat_id]
+                batch, rest = ids[:MAX_DELETE_BATCH], ids[MAX_DELETE_BATCH:]
+                if rest:
+                    self._deletes[chat_id] = rest
+                    self._deletes.move_to_end(chat_id)
+                else:
+                    del self._deletes[chat_id]
+                return ('delete', chat_id, batch), None
+            wait = blocked if wait is None else min(wait, blocked)
+
+        expired = 0
+        for index, action in enumerate(self._sends):
+            if now - action.created_at > self.send_ttl:
+                expired += 1
+                continue
+            blocked = max(self._blocked_until.get((action.chat_id, 'send'), 0) - now,
+                          self._chat_budget(action.chat_id).wait_time(now))
+            if blocked <= 0:
+                del self._sends[index]
+                self._drop_expired(now)
+                self._chat_budget(action.chat_id).take(now)
+                return ('send', action.chat_id, action), None
+            wait = blocked if wait is None else min(wait, blocked)
+
+        if expired:
+            self._drop_expired(now)
+        return None, wait
+
+    def _drop_expired(self, now: float):
+        # Предупреждение, простоявшее в очереди дольше send_ttl, уже неактуально
+        kept = deque()
+        for action in self._sends:
+            if now - action.created_at > self.send_ttl:
+                OUTBOUND_ACTIONS.inc(action.kind, 'expired')
+                if not action.future.done():
+                    action.future.set_result(None)
+            else:
+                kept.append(action)
+        self._sends = kept
+
+    # === Выполнение ===
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            if now - self._pruned_at >= PRUNE_INTERVAL:
+                self._prune(now)
+            global_wait = self._global.wait_time(now)
+            if global_wait:
+                await asyncio.sleep(global_wait)
+                continue
+
+            action, wait = self._next_action(now)
+            if action is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global.take(now)
+            await self._in_flight.acquire()
+            task = asyncio.create_task(self._execute(action))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, action):
+        kind, chat_id, payload = action
+        try:
+            if kind == 'delete':
+                await self._delete(chat_id, payload)
+            else:
+                await self._send(chat_id, payload)
+        finally:
+            self._in_flight.release()
+
+    async def _delete(self, chat_id: int, message_ids: List[int]):
+        try:
+            if len(message_ids) == 1:
+                await self.bot.delete_message(chat_id, message_ids[0])
+            else:
+                await self.bot.delete_messages(chat_id, message_ids)
+            OUTBOUND_ACTIONS.inc('delete', 'ok', amount=len(message_ids))
+        except TelegramRetryAfter as e:
+            OUTBOUND_ACTIONS.inc('delete', 'flood_wait')
+            self._block(chat_id, 'delete', e.retry_after)
+            # Возвращаем в начало очереди чата
+            self._deletes[chat_id] = message_ids + self._deletes.get(chat_id, [])
+            self._deletes.move_to_end(chat_id, last=False)
+            self._notify()
+        except TelegramBadRequest as e:
+            # Сообщение уже удалено или слишком старое
+            OUTBOUND_ACTIONS.inc('delete', 'bad_request')
+            logger.debug("Не удалось удалить сообщения %s в чате %s: %s", message_ids, chat_id, e)
+        except Exception as e:
+            OUTBOUND_ACTIONS.inc('delete', 'error')
+            logger.warning("Ошибка удаления сообщений в чате %s: %s", chat_id, e)
+
+    async def _send(self, chat_id: int, action: _SendAction):
+        try:
+            result = await action.factory()
+            OUTBOUND_ACTIONS.inc(action.kind, 'ok')
+            if not action.future.done():
+                action.future.set_result(result)
+        except TelegramRetryAfter as e:
+            OUTBOUND_ACTIONS.inc(action.kind, 'flood_wait')
+            self._block(chat_id, 'send', e.retry_after)
+            self._sends.appendleft(action)
+            self._notify()
+        except Exception as e:
+            OUTBOUND_ACTIONS.inc(action.kind, 'error')
+            logger.warning("Ошибка отправки в чат %s: %s", chat_id, e)
+            if not action.future.done():
+                action.future.set_result(None)
+
+    def _block(self, chat_id: int, kind: str, retry_after: float):
+        key = (chat_id, kind)
+        until = time.monotonic() + retry_after
+        self._blocked_until[key] = max(self._blocked_until.get(key, 0), until)
+        logger.warning("Flood control в чате %s: пауза %s сек", chat_id, retry_after)
+
+    async def stop(self, timeout: float = 5.0):
+        # Наступившие удаления уходят в очередь, остальные сохраняются до следующего запуска
+        await self.deletions.stop()
+
+        # Пытаемся отправить оставшееся, но не дольше timeout
+        deadline = time.monotonic() + timeout
+        while (self._deletes or self._sends or self._tasks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for action in self._sends:
+            if not action.future.done():
+                action.future.set_result(None)
+        self._sends.clear()
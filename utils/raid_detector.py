@@ -0,0 +1,105 @@
+import logging
+import time
+from typing import Dict, List, Optional
+
+from .lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Скользящее окно делится на столько корзин
+WINDOW_SLOTS = 10
+
+
+class _GroupState:
+    __slots__ = ('counts', 'slot', 'total', 'active', 'forced', 'hot_at')
+
+    def __init__(self):
+        self.counts: List[int] = [0] * WINDOW_SLOTS
+        self.slot = 0
+        self.total = 0
+        self.active = False
+        # None — автоматический режим, True/False — включено/выключено администратором
+        self.forced: Optional[bool] = None
+        self.hot_at = 0.0
+
+
+# Детектор рейдов: считает сообщения группы в скользящем окне и при превышении
+# порога включает режим рейда. Выключается сам, когда поток держится ниже
+# половины порога в течение cooldown. Во время рейда доверенными считаются
+# только участники, писавшие в группу не позже чем за trusted_age до этого.
+# Первое появление участника хранится в памяти, после перезапуска бота
+# доверие набирается заново. slow_mode_delay — медленный режим на время рейда.
+class RaidDetector:
+    def __init__(self, threshold: int = 30, window: float = 10.0, cooldown: float = 60.0,
+                 trusted_age: float = 600.0, slow_mode_delay: int = 30, max_members: int = 200000):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.trusted_age = trusted_age
+        self.slow_mode_delay = slow_mode_delay
+        self._slot_width = window / WINDOW_SLOTS
+        self._groups: Dict[str, _GroupState] = {}
+        # (group_id, user_id) -> monotonic-время первого сообщения в группе
+        self._first_seen = LRUCache(max_members)
+
+    def _state(self, group_id: str) -> _GroupState:
+        state = self._groups.get(group_id)
+        if state is None:
+            state = self._groups[group_id] = _GroupState()
+        return state
+
+    def _count(self, state: _GroupState, now: float) -> int:
+        slot = int(now / self._slot_width)
+        if slot - state.slot >= WINDOW_SLOTS:
+            state.counts = [0] * WINDOW_SLOTS
+            state.total = 0
+        else:
+            for stale in range(state.slot + 1, slot + 1):
+                index = stale % WINDOW_SLOTS
+                state.total -= state.counts[index]
+                state.counts[index] = 0
+        state.slot = slot
+        state.counts[slot % WINDOW_SLOTS] += 1
+        state.total += 1
+        return state.total
+
+    def observe(self, group_id: str, user_id: int) -> bool:
+        # Учитывает сообщение и возвращает, действует ли в группе режим рейда
+        now = time.monotonic()
+        state = self._state(group_id)
+        count = self._count(state, now)
+
+        if count >= self.threshold / 2:
+            state.hot_at = now
+        if state.forced is None:
+            if not state.active and count >= self.threshold:
+                state.active = True
+                logger.warning("🚨 Режим рейда включён в группе %s: %s сообщений за %s сек",
+                               group_id, count, self.window)
+            elif state.active and now - state.hot_at >= self.cooldown:
+                state.active = False
+                logger.warning("✅ Режим рейда в группе %s выключен: поток сообщений спал", group_id)
+
+        active = state.forced if state.forced is not None else state.active
+        # Во время рейда новички не набирают доверие; get продлевает жизнь записи в LRU
+        if not active and self._first_seen.get((group_id, user_id)) is None:
+            self._first_seen.put((group_id, user_id), now)
+        return active
+
+    def is_trusted(self, group_id: str, user_id: int) -> bool:
+        first_seen = self._first_seen.get((group_id, user_id))
+        return first_seen is not None and time.monotonic() - first_seen >= self.trusted_age
+
+    def is_active(self, group_id: str) -> bool:
+        state = self._groups.get(group_id)
+        if state is None:
+            return False
+        return state.forced if state.forced is not None else state.active
+
+    def force(self, group_id: str, active: Optional[bool]):
+        # active=None возвращает группу под автоматическое управление
+        state = self._state(group_id)
+        state.forced = active
+        state.active = bool(active)
+        logger.warning("Режим рейда в группе %s переключён администратором: %s",
+                       group_id, {True: "вкл", False: "выкл", None: "авто"}[active])
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+
+# Token bucket медленного режима по паре (пользователь, группа).
+# Ведро вмещает burst сообщений и пополняется на одно сообщение за delay секунд.
+class SlowModeLimiter:
+    def __init__(self, max_entries: int = 100000, sweep_interval: int = 1000):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        # (user_id, group_id) -> [tokens, updated_at, full_at]
+        self._buckets: "OrderedDict[Tuple[int, str], list]" = OrderedDict()
+        self._checks = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def check(self, user_id: int, group_id: str, delay: float, burst: int = 1) -> float:
+        # Возвращает 0, если сообщение разрешено, иначе сколько секунд осталось ждать
+        if delay <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        burst = max(1, burst)
+        key = (user_id, group_id)
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            tokens = float(burst)
+        else:
+            tokens = min(float(burst), bucket[0] + (now - bucket[1]) / delay)
+            self._buckets.move_to_end(key)
+
+        if tokens < 1:
+            bucket[0], bucket[1] = tokens, now
+            return (1 - tokens) * delay
+
+        tokens -= 1
+        full_at = now + (burst - tokens) * delay
+        if bucket is None:
+            self._buckets[key] = [tokens, now, full_at]
+        else:
+            bucket[0], bucket[1], bucket[2] = tokens, now, full_at
+
+        self._checks += 1
+        if self._checks >= self.sweep_interval or len(self._buckets) > self.max_entries:
+            self.evict_idle(now)
+        return 0.0
+
+    def evict_idle(self, now: float = None):
+        # Полное ведро ничем не отличается от отсутствующего, такие записи можно удалить
+        now = time.monotonic() if now is None else now
+        self._checks = 0
+        for key in [key for key, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+
+    def refund(self, user_id: int, group_id: str):
+        # Возвращает жетон, если разрешённое медленным режимом сообщение всё же удалено
+        bucket = self._buckets.get((user_id, group_id))
+        if bucket is not None:
+            bucket[0] += 1
+
+    def reset(self, user_id: int, group_id: str):
+        self._buckets.pop((user_id, group_id), None)
+
+    def save_snapshot(self, path: str):
+        self.evict_idle()
+        # Монотонное время не переживает перезапуск, сохраняем настенное
+        offset = time.time() - time.monotonic()
+        data = [
+            [user_id, group_id, bucket[0], bucket[1] + offset, bucket[2] + offset]
+            for (user_id, group_id), bucket in self._buckets.items()
+        ]
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path: str):
+        if not os.path.exists(path):
+            return
+
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        offset = time.time() - time.monotonic()
+        for user_id, group_id, tokens, updated_at, full_at in data:
+            self._buckets[(user_id, group_id)] = [tokens, updated_at - offset, full_at - offset]
+        self.evict_idle()
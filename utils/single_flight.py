@@ -0,0 +1,20 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+# Объединение одновременных запросов: пока запрос по ключу выполняется,
+# остальные вызовы с тем же ключом ждут его результат, а не делают свой.
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(task)
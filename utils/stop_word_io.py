@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Iterable, Iterator, Tuple
+
+
+# Чтение списков стоп-слов из загруженного документа. Поддерживаются:
+#   .txt  — одно слово на строку, строки с # пропускаются;
+#   .csv  — слово в первой колонке, тип (word, wildcard, regex) — во второй;
+#   .json — список строк или объектов {"word": ..., "kind": ...}.
+# Текстовые форматы читаются построчно, без загрузки файла в память целиком.
+# Возвращаются пары (слово, тип); проверка и приведение к форме хранения — в базе.
+def read_stop_words(stream: BinaryIO, filename: str = '') -> Iterator[Tuple[str, str]]:
+    name = (filename or '').lower()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        if name.endswith('.json'):
+            yield from _read_json(text)
+        elif name.endswith('.csv'):
+            yield from _read_csv(text)
+        else:
+            yield from _read_txt(text)
+    finally:
+        # Поток принадлежит вызывающему коду
+        text.detach()
+
+
+def _read_txt(text) -> Iterator[Tuple[str, str]]:
+    for line in text:
+        word = line.strip()
+        if word and not word.startswith('#'):
+            yield word, 'word'
+
+
+def _read_csv(text) -> Iterator[Tuple[str, str]]:
+    try:
+        for index, row in enumerate(csv.reader(text)):
+            if not row or not row[0].strip():
+                continue
+            word = row[0].strip()
+            kind = row[1].strip().lower() if len(row) > 1 and row[1].strip() else 'word'
+            # Строка заголовка, как в файле экспорта
+            if index == 0 and word.lower() == 'word' and kind in ('word', 'kind'):
+                continue
+            yield word, kind
+    except csv.Error as e:
+        raise ValueError(f"Ошибка разбора CSV: {e}")
+
+
+def _read_json(text) -> Iterator[Tuple[str, str]]:
+    data = json.load(text)
+    if isinstance(data, dict):
+        data = data.get('words', [])
+    if not isinstance(data, list):
+        raise ValueError("Ожидается JSON-список слов")
+    for item in data:
+        if isinstance(item, str):
+            word, kind = item, 'word'
+        elif isinstance(item, dict):
+            word, kind = str(item.get('word') or ''), str(item.get('kind') or 'word')
+        else:
+            continue
+        if word.strip():
+            yield word.strip(), kind.lower()
+
+
+# Экспорт в CSV, который принимает и импорт: строки пишутся по мере чтения из базы
+def write_stop_words(rows: Iterable[Tuple[str, str]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('word', 'kind'))
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
@@ -0,0 +1,420 @@
+import re
+import string
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .text_normalizer import canonicalize
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+MAX_PATTERN_LENGTH = 200
+# Верхняя граница повторений в регулярных выражениях: поиск пробует каждую позицию
+# текста, и неограниченное повторение делает его квадратичным по длине сообщения
+MAX_REPEAT_SPAN = 32
+# Символов, которые может заменить '*' в шаблоне, и звёздочек в одном шаблоне
+WILDCARD_SPAN = 16
+MAX_WILDCARD_STARS = 2
+
+_TO_PLACEHOLDERS = str.maketrans({'*': '\ue000', '?': '\ue001'})
+_FROM_PLACEHOLDERS = str.maketrans({'\ue000': '*', '\ue001': '?'})
+
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+_ZERO_WIDTH = (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT)
+_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: re.compile(r'\d'), sre_parse.CATEGORY_NOT_DIGIT: re.compile(r'\D'),
+    sre_parse.CATEGORY_SPACE: re.compile(r'\s'), sre_parse.CATEGORY_NOT_SPACE: re.compile(r'\S'),
+    sre_parse.CATEGORY_WORD: re.compile(r'\w'), sre_parse.CATEGORY_NOT_WORD: re.compile(r'\W'),
+}
+# Символы, на которых сравниваются классы соседних повторений
+_PROBE = string.printable + ''.join(map(chr, range(0x400, 0x460))) + '\u00a0\u2028_\u00ab\u00bb\u2014'
+
+
+def is_wildcard(word: str) -> bool:
+    return '*' in word or '?' in word
+
+
+def normalize_wildcard(wildcard: str) -> str:
+    # Шаблон приводится к канонической форме целиком, как и текст сообщений, чтобы
+    # пробелы вокруг '*' и '?' сохранились. На время canonicalize они заменяются
+    # символами из области частного использования, которые она не трогает
+    return canonicalize(wildcard.translate(_TO_PLACEHOLDERS)).translate(_FROM_PLACEHOLDERS)
+
+
+def wildcard_to_regex(wildcard: str) -> str:
+    # '*' — до WILDCARD_SPAN букв внутри слова, '?' — ровно одна буква.
+    # Ограниченная длина держит перебор линейным по длине текста
+    if wildcard.count('*') > MAX_WILDCARD_STARS:
+        raise ValueError(f"В шаблоне допускается не больше {MAX_WILDCARD_STARS} символов '*'")
+    parts = []
+    for char in wildcard:
+        if char == '*':
+            parts.append(rf'\w{{0,{WILDCARD_SPAN}}}')
+        elif char == '?':
+            parts.append(r'\w')
+        else:
+            parts.append(re.escape(char))
+    pattern = ''.join(parts)
+    if not wildcard.strip('*?') or re.match(pattern, ''):
+        raise ValueError("Шаблон совпадает с любым текстом")
+    return pattern
+
+
+def _check_tree(tree, repeated: bool = False):
+    for op, av in tree:
+        if op in _REPEATS:
+            low, high, subpattern = av
+            if high > 1:
+                # (a+)+, (a|ab)* и подобное дают экспоненциальный перебор
+                if repeated:
+                    raise ValueError("Вложенные повторения не поддерживаются")
+                if any(sub_op == sre_parse.BRANCH for sub_op, _ in _flatten(subpattern)):
+                    raise ValueError("Альтернатива внутри повторения не поддерживается")
+            _check_tree(subpattern, repeated or high > 1)
+        elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            raise ValueError("Обратные ссылки не поддерживаются")
+        elif op == sre_parse.SUBPATTERN:
+            _check_tree(av[-1], repeated)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            _check_tree(av[1], repeated)
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                _check_tree(branch, repeated)
+        elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+            _check_tree(av, repeated)
+
+
+def _char_test(op, av):
+    # Проверка одного символа для элемента, который всегда съедает ровно один символ;
+    # None — элемент сложнее, его классом считается любой символ
+    if op == sre_parse.LITERAL:
+        return lambda char: char.lower() == chr(av).lower()
+    if op == sre_parse.NOT_LITERAL:
+        return lambda char: char.lower() != chr(av).lower()
+    if op == sre_parse.ANY:
+        return lambda char: char != '\n'
+    if op != sre_parse.IN:
+        return None
+
+    negate = bool(av) and av[0][0] == sre_parse.NEGATE
+    tests = []
+    for item_op, item_av in av[negate:]:
+        if item_op == sre_parse.LITERAL:
+            tests.append(lambda char, code=item_av: char.lower() == chr(code).lower())
+        elif item_op == sre_parse.RANGE:
+            tests.append(lambda char, low=item_av[0], high=item_av[1]:
+                         low <= ord(char.lower()) <= high or low <= ord(char.upper()) <= high)
+        elif item_op == sre_parse.CATEGORY and item_av in _CATEGORIES:
+            tests.append(lambda char, category=_CATEGORIES[item_av]: category.match(char) is not None)
+        else:
+            return None
+    return lambda char: any(test(char) for test in tests) != negate
+
+
+def _body_test(subpattern):
+    items = list(_inline(subpattern))
+    return _char_test(*items[0]) if len(items) == 1 else None
+
+
+def _overlaps(first, second) -> bool:
+    if first is None or second is None:
+        return True
+    return any(first(char) and second(char) for char in _PROBE)
+
+
+def _check_sequence(tree):
+    # Два переменных повторения подряд, которые могут съесть одни и те же символы
+    # (\d*\d*, \w+a\w+, a?a?a?), делят между собой строку всеми способами: перебор
+    # растёт как степень длины текста. Соседние повторения должны разделяться
+    # обязательным символом, который не подходит под класс предыдущего
+    opened = []
+    for op, av in _inline(tree):
+        if op in _REPEATS:
+            low, high, subpattern = av
+            _check_sequence(subpattern)
+            test = _body_test(subpattern)
+            if high > low:
+                if any(_overlaps(previous, test) for previous in opened):
+                    raise ValueError("Соседние повторения с пересекающимися символами не поддерживаются")
+                if low:
+                    opened = []
+                opened.append(test)
+                continue
+        elif op in _ZERO_WIDTH:
+            if op != sre_parse.AT:
+                _check_sequence(av[1])
+            continue
+        elif op == sre_parse.BRANCH or op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+            for branch in (av[1] if op == sre_parse.BRANCH else [av]):
+                _check_sequence(branch)
+            if any(sub_op in _REPEATS for sub_op, _ in _flatten([(op, av)])):
+                if opened:
+                    raise ValueError("Соседние повторения с пересекающимися символами не поддерживаются")
+                opened = [None]
+            continue
+        else:
+            test = _char_test(op, av)
+        # Обязательный символ закрывает повторения, под класс которых он не подходит
+        opened = [previous for previous in opened if _overlaps(previous, test)]
+
+
+def _inline(tree):
+    # Группа без повторения — часть той же последовательности
+    for op, av in tree:
+        if op == sre_parse.SUBPATTERN:
+            yield from _inline(av[-1])
+        else:
+            yield op, av
+
+
+def _flatten(tree):
+    for op, av in tree:
+        yield op, av
+        if op == sre_parse.SUBPATTERN:
+            yield from _flatten(av[-1])
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                yield from _flatten(branch)
+
+
+_QUANTIFIER = re.compile(r'\{(\d*)(,?)(\d*)\}')
+
+
+def bound_repeats(pattern: str) -> str:
+    # *, + и {m,} заменяются на повторения не длиннее MAX_REPEAT_SPAN. Для поиска
+    # стоп-слова это почти ничего не меняет: достаточно совпадения начала
+    parts = []
+    index, length = 0, len(pattern)
+    after_quantifier = False
+    while index < length:
+        char = pattern[index]
+        quantifier = False
+        if char == '\\':
+            parts.append(pattern[index:index + 2])
+            index += 2
+        elif char == '[':
+            # Класс символов копируется целиком; ']' сразу после '[' или '[^' — символ класса
+            end = index + 1
+            if pattern.startswith('^', end):
+                end += 1
+            if pattern.startswith(']', end):
+                end += 1
+            while end < length and pattern[end] != ']':
+                end += 2 if pattern[end] == '\\' else 1
+            parts.append(pattern[index:end + 1])
+            index = end + 1
+        elif pattern.startswith('(?#', index):
+            end = pattern.find(')', index)
+            end = length if end < 0 else end + 1
+            parts.append(pattern[index:end])
+            index = end
+        elif char in '+?' and after_quantifier:
+            # Ленивое или захватывающее повторение: суффикс предыдущего квантификатора
+            parts.append(char)
+            index += 1
+        elif char in '*+':
+            parts.append(f'{{{0 if char == "*" else 1},{MAX_REPEAT_SPAN}}}')
+            index += 1
+            quantifier = True
+        elif char == '{' and _QUANTIFIER.match(pattern, index) and any(_QUANTIFIER.match(pattern, index).groups()):
+            match = _QUANTIFIER.match(pattern, index)
+            low, comma, high = match.groups()
+            low = int(low or 0)
+            high = min(int(high), max(low, MAX_REPEAT_SPAN)) if high else (max(low, MAX_REPEAT_SPAN) if comma else low)
+            parts.append(f'{{{low},{high}}}')
+            index = match.end()
+            quantifier = True
+        else:
+            parts.append(char)
+            index += 1
+            quantifier = char == '?'
+        after_quantifier = quantifier
+    return ''.join(parts)
+
+
+def _walk(tree):
+    for op, av in tree:
+        yield op, av
+        if op in _REPEATS:
+            yield from _walk(av[2])
+        elif op == sre_parse.SUBPATTERN:
+            yield from _walk(av[-1])
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            yield from _walk(av[1])
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                yield from _walk(branch)
+        elif op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+            yield from _walk(av)
+
+
+def validate_regex(pattern: str) -> str:
+    # Регулярное выражение администратора проверяется до сохранения: оно попадает
+    # в общую альтернативу группы и выполняется на каждом сообщении. Хранится оно
+    # как введено, а проверяется и выполняется с ограниченными повторениями
+    if not pattern:
+        raise ValueError("Пустое регулярное выражение")
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"Регулярное выражение длиннее {MAX_PATTERN_LENGTH} символов")
+    try:
+        # Обёртка ловит глобальные флаги вроде (?i) не в начале общей альтернативы
+        bounded = bound_repeats(pattern)
+        tree = sre_parse.parse(f'(?:{bounded})', re.IGNORECASE)
+        compiled = re.compile(bounded, re.IGNORECASE)
+    except (re.error, RecursionError, OverflowError) as e:
+        raise ValueError(f"Некорректное регулярное выражение: {e}")
+    if tree.state.groupdict:
+        raise ValueError("Именованные группы не поддерживаются")
+    # В режиме x пробелы и комментарии меняют разбор, и повторения не ограничить надёжно
+    if any(op == sre_parse.SUBPATTERN and av[1] & re.VERBOSE for op, av in _walk(tree)):
+        raise ValueError("Флаг x не поддерживается")
+    if any(op in _REPEATS and av[0] > MAX_REPEAT_SPAN for op, av in _walk(tree)):
+        raise ValueError(f"Повторения длиннее {MAX_REPEAT_SPAN} символов не поддерживаются")
+    if any(op in _REPEATS and av[1] > MAX_REPEAT_SPAN for op, av in _walk(tree)):
+        raise ValueError("Не удалось ограничить повторения в выражении")
+    _check_tree(tree)
+    _check_sequence(tree)
+    if compiled.search('') is not None:
+        raise ValueError("Выражение совпадает с пустой строкой, то есть с любым сообщением")
+    return pattern
+
+
+def normalize_stop_word(word: str, kind: str = 'word') -> Tuple[str, str]:
+    # Форма, в которой стоп-слово хранится в базе, и его тип. Слово со * или ?
+    # считается шаблоном. ValueError — если шаблон или выражение недопустимы
+    # или от слова после приведения к канонической форме ничего не осталось
+    if kind == 'regex':
+        return validate_regex(word), kind
+    if kind == 'wildcard' or is_wildcard(word):
+        wildcard = normalize_wildcard(word)
+        wildcard_to_regex(wildcard)
+        return wildcard, 'wildcard'
+    if kind != 'word':
+        raise ValueError(f"Неизвестный тип стоп-слова: {kind}")
+    stored = canonicalize(word)
+    if not stored:
+        raise ValueError("после нормализации от слова ничего не осталось")
+    return stored, kind
+
+
+def _combine(patterns: List[str]) -> Optional[re.Pattern]:
+    # Одна альтернатива на все шаблоны. Группа на каждый шаблон делает поиск по
+    # большой альтернативе сверхлинейным, поэтому обёртки без захвата, а какой
+    # шаблон сработал, выясняется только после совпадения
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+
+def _compile_each(patterns: List[str]) -> List[re.Pattern]:
+    return [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+
+def _matched(patterns: List[re.Pattern], text: str, start: int) -> int:
+    # Альтернатива выбирает первый шаблон, совпавший в самой левой позиции,
+    # так что достаточно проверить шаблоны по очереди с этой позиции
+    for index, pattern in enumerate(patterns):
+        if pattern.match(text, start):
+            return index
+    return 0
+
+
+# Автомат Ахо-Корасик: поиск всех стоп-слов за один проход по тексту.
+# Шаблоны со звёздочками ищутся в том же каноническом тексте, регулярные
+# выражения — в исходном тексте сообщения: в них важны цифры и знаки
+class StopWordMatcher:
+    def __init__(self, words: Iterable[str], wildcards: Iterable[str] = (), regexes: Iterable[str] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]
+        self.size = 0
+
+        for word in words:
+            if word:
+                self._add(word)
+        self._build()
+
+        self._wildcards = list(dict.fromkeys(wildcards))
+        self._regexes = list(dict.fromkeys(regexes))
+        self._wildcard_sources = [wildcard_to_regex(wildcard) for wildcard in self._wildcards]
+        self._wildcard_pattern = _combine(self._wildcard_sources)
+        self._regex_sources = [bound_repeats(regex) for regex in self._regexes]
+        self._regex_pattern = _combine(self._regex_sources)
+        # Отдельные выражения компилируются при первом совпадении
+        self._wildcard_compiled: Optional[List[re.Pattern]] = None
+        self._regex_compiled: Optional[List[re.Pattern]] = None
+        self.size += len(self._wildcards) + len(self._regexes)
+
+    def _add(self, word: str):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = next_state
+
+        if self._output[state] is None:
+            self._output[state] = word
+            self.size += 1
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+
+                # Если суффикс является стоп-словом, состояние тоже конечное
+                if self._output[next_state] is None:
+                    self._output[next_state] = self._output[fail]
+
+    def find(self, text: str, raw: str = None) -> Optional[str]:
+        # text — каноническая форма сообщения, raw — исходный текст для регулярных выражений
+        found = self._search(text, raw)
+        if not isinstance(found, re.Match):
+            return found
+        if found.re is self._wildcard_pattern:
+            if self._wildcard_compiled is None:
+                self._wildcard_compiled = _compile_each(self._wildcard_sources)
+            return self._wildcards[_matched(self._wildcard_compiled, found.string, found.start())]
+        if self._regex_compiled is None:
+            self._regex_compiled = _compile_each(self._regex_sources)
+        return self._regexes[_matched(self._regex_compiled, found.string, found.start())]
+
+    def matches(self, text: str, raw: str = None) -> bool:
+        # Какой шаблон сработал, здесь не важно, и отдельные выражения не компилируются
+        return self._search(text, raw) is not None
+
+    def _search(self, text: str, raw: str = None) -> Union[str, re.Match, None]:
+        # Стоп-слово из автомата или совпадение общей альтернативы шаблонов
+        if not self.size:
+            return None
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+
+        if self._wildcard_pattern is not None:
+            match = self._wildcard_pattern.search(text)
+            if match:
+                return match
+        if self._regex_pattern is not None:
+            return self._regex_pattern.search(raw if raw is not None else text)
+        return None
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import time
+from typing import List, Tuple
+
+from .lru_cache import LRUCache
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = ('member', 'administrator', 'creator')
+
+
+# Кэш статуса подписки на каналы с раздельными TTL для подписанных и неподписанных.
+# Одновременные запросы одной пары (пользователь, канал) ждут общий вызов API.
+class SubscriptionCache:
+    def __init__(self, bot, positive_ttl: float = 300, negative_ttl: float = 30, max_entries: int = 100000):
+        self.bot = bot
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # (user_id, channel) -> (is_subscribed, expires_at); при переполнении вытесняется
+        # давно не проверявшаяся пара, без обхода всего кэша
+        self._statuses = LRUCache(max_entries)
+        self._fetches = SingleFlight()
+
+    async def check(self, user_id: int, channels: List[str]) -> bool:
+        if not channels:
+            return True
+        results = await asyncio.gather(*(self.is_subscribed(user_id, channel) for channel in channels))
+        return all(results)
+
+    async def is_subscribed(self, user_id: int, channel: str) -> bool:
+        key = (user_id, channel)
+        cached = self._statuses.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        return await self._fetches.run(key, lambda: self._fetch(user_id, channel))
+
+    async def _fetch(self, user_id: int, channel: str) -> bool:
+        try:
+            chat_member = await self.bot.get_chat_member(channel, user_id)
+        except Exception as e:
+            # Ошибки не кэшируем, чтобы временный сбой API не закрыл группу надолго
+            logger.warning("Ошибка проверки подписки на %s: %s", channel, e)
+            return False
+
+        is_subscribed = chat_member.status in SUBSCRIBED_STATUSES
+        ttl = self.positive_ttl if is_subscribed else self.negative_ttl
+        self._store((user_id, channel), is_subscribed, time.monotonic() + ttl)
+        return is_subscribed
+
+    def _store(self, key: Tuple[int, str], is_subscribed: bool, expires_at: float):
+        self._statuses.put(key, (is_subscribed, expires_at))
+
+    def invalidate(self, user_id: int = None, channel: str = None):
+        if user_id is None and channel is None:
+            self._statuses.clear()
+            return
+
+        for key in list(self._statuses):
+            if (user_id is None or key[0] == user_id) and (channel is None or key[1] == channel):
+                self._statuses.pop(key)
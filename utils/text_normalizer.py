@@ -0,0 +1,64 @@
+import re
+import unicodedata
+
+# Каноническая форма текста для поиска стоп-слов. Обходы фильтра вроде «cпaм»
+# латиницей, «с.п.а.м», «с п а м», «спаааам» и невидимых символов внутри слова
+# сводятся к одному виду. Стоп-слова хранятся в той же форме, поэтому
+# canonicalize применяется и к ним, и к каждому сообщению — один раз.
+
+# Невидимые символы, которыми разбивают слова
+ZERO_WIDTH = ('\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e\u200b\u200c\u200d\u200e\u200f'
+              '\u202a\u202b\u202c\u202d\u202e\u2060\u2061\u2062\u2063\u2064\u206a\u206b\u206c'
+              '\u206d\u206e\u206f\u3164\ufeff\uffa0')
+
+# Ударения и прочие комбинируемые диакритические знаки
+COMBINING = ''.join(chr(code) for code in range(0x0300, 0x0370))
+
+# Разделители внутри слова удаляются целиком
+SEPARATORS = '.,-_*·•|/\\\'"`~^+=:;!?()[]{}<>'
+
+# Похожие на кириллицу латинские, греческие буквы и цифры (после lower()).
+# Только те, что похожи именно в нижнем регистре: «b» -> «в» или «n» -> «п»
+# превращали бы «bet» в «вет», и такое стоп-слово находилось бы в «привет».
+# После изменения таблицы сохранённые стоп-слова пересчитывает миграция
+HOMOGLYPHS = {
+    'a': 'а', 'c': 'с', 'e': 'е', 'o': 'о', 'p': 'р', 'x': 'х', 'y': 'у',
+    'і': 'и', 'є': 'е', 'ѕ': 'с',
+    'α': 'а', 'ε': 'е', 'κ': 'к', 'ο': 'о', 'π': 'п', 'ρ': 'р', 'τ': 'т', 'υ': 'у', 'χ': 'х',
+    '0': 'о', '3': 'з', '4': 'ч', '6': 'б', '@': 'а', '$': 'с',
+}
+
+_TABLE = str.maketrans({
+    **{char: None for char in ZERO_WIDTH + COMBINING + SEPARATORS},
+    **{char: ' ' for char in '\t\n\r\f\v\u00a0\u2007\u202f'},
+    **HOMOGLYPHS,
+})
+_REPEATS = re.compile(r'(\w)\1+')
+
+
+def _join_spaced_letters(text: str) -> str:
+    # «с п а м» -> «спам»: три и больше одиночных символа подряд склеиваются
+    words = text.split()
+    result = []
+    run = []
+    for word in words:
+        if len(word) == 1:
+            run.append(word)
+            continue
+        if run:
+            result.extend([''.join(run)] if len(run) >= 3 else run)
+            run = []
+        result.append(word)
+    if run:
+        result.extend([''.join(run)] if len(run) >= 3 else run)
+    return ' '.join(result)
+
+
+def canonicalize(text: str) -> str:
+    if not text.isascii():
+        # Полноширинные и надстрочные символы -> обычные, буквы с диакритикой
+        # раскладываются на букву и знак, а знак удаляется таблицей: «spám», «ё», «й»
+        text = unicodedata.normalize('NFKD', text)
+    text = text.lower().translate(_TABLE)
+    text = _join_spaced_letters(text)
+    return _REPEATS.sub(r'\1', text)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+UserFields = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+# Отложенная запись справочника пользователей: неизменившиеся данные не пишутся,
+# изменения копятся в памяти и сохраняются одной транзакцией по размеру или по таймеру
+class UserDirectoryBuffer:
+    def __init__(self, flush_func: Callable[[List[tuple]], Awaitable[None]], max_batch: int = 500,
+                 flush_interval: float = 5.0, refresh_interval: float = 3600.0, max_known: int = 200000):
+        self.flush_func = flush_func
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self.max_known = max_known
+        # user_id -> (поля, когда последний раз записаны)
+        self._known: Dict[int, Tuple[UserFields, float]] = {}
+        self._pending: Dict[int, UserFields] = {}
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._size_flush: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def touch(self, user_id: int, username: str = None, first_name: str = None, last_name: str = None):
+        fields = (username, first_name, last_name)
+        now = time.monotonic()
+        known = self._known.get(user_id)
+        # last_seen всё же обновляем раз в refresh_interval
+        if known and known[0] == fields and now - known[1] < self.refresh_interval:
+            return
+
+        self._pending[user_id] = fields
+        self._remember(user_id, fields, now)
+
+        if self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_periodically())
+        if len(self._pending) >= self.max_batch and (self._size_flush is None or self._size_flush.done()):
+            self._size_flush = asyncio.ensure_future(self.flush())
+
+    def _remember(self, user_id: int, fields: UserFields, now: float):
+        if len(self._known) >= self.max_known:
+            for key in list(self._known)[:self.max_known // 10 or 1]:
+                del self._known[key]
+        self._known[user_id] = (fields, now)
+
+    def find_by_username(self, username: str) -> Optional[dict]:
+        # Ещё не записанные изменения тоже должны находиться по username
+        for user_id, (pending_username, first_name, last_name) in self._pending.items():
+            if pending_username == username:
+                return {
+                    'user_id': user_id,
+                    'username': pending_username,
+                    'first_name': first_name,
+                    'last_name': last_name
+                }
+        return None
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            pending, self._pending = self._pending, {}
+            rows = [(user_id,) + fields for user_id, fields in pending.items()]
+            try:
+                await self.flush_func(rows)
+            except Exception as e:
+                logger.error("Ошибка записи пользователей: %s", e)
+                # Возвращаем несохранённое, не затирая более свежие изменения
+                for user_id, fields in pending.items():
+                    self._pending.setdefault(user_id, fields)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
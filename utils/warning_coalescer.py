@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from .metrics import WARNINGS
+from .outbound import OutboundQueue
+
+
+class _Warning:
+    __slots__ = ('message_id', 'text', 'active_until', 'visible_until', 'edited_at')
+
+    def __init__(self, text: str, active_until: float, visible_until: float):
+        self.message_id: Optional[int] = None
+        self.text = text
+        self.active_until = active_until
+        self.visible_until = visible_until
+        self.edited_at = 0.0
+
+
+# Склейка предупреждений: на (пользователь, группа, причина) отправляется не больше
+# одного предупреждения за окно. Повторные нарушения продлевают показ уже
+# отправленного сообщения, а если текст изменился (например, оставшееся время
+# медленного режима) — редактируют его, но не чаще edit_interval.
+class WarningCoalescer:
+    def __init__(self, outbound: OutboundQueue, window: float = 10.0, edit_interval: float = 5.0):
+        self.outbound = outbound
+        self.window = window
+        self.edit_interval = edit_interval
+        self._warnings: Dict[Tuple[int, int, str], _Warning] = {}
+        self._swept_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._warnings)
+
+    def warn(self, chat_id: int, user_id: int, reason: str, text: str, delete_after: float):
+        now = time.monotonic()
+        self._sweep(now)
+
+        key = (user_id, chat_id, reason)
+        warning = self._warnings.get(key)
+        if warning is None or now >= warning.active_until:
+            self._send(key, chat_id, reason, text, delete_after, now)
+            return
+
+        WARNINGS.inc(reason, 'suppressed')
+        warning.active_until = max(warning.active_until, now + delete_after)
+
+        # Сообщение уже удалено — продлевать нечего
+        if now >= warning.visible_until:
+            return
+        warning.visible_until = now + delete_after
+        # Ещё стоит в очереди: удаление запланируется после отправки с новым сроком
+        if warning.message_id is None:
+            return
+
+        self.outbound.deletions.schedule(chat_id, warning.message_id, delete_after)
+        if text != warning.text and now - warning.edited_at >= self.edit_interval:
+            warning.text = text
+            warning.edited_at = now
+            WARNINGS.inc(reason, 'edited')
+            self.outbound.edit_message_text(chat_id, warning.message_id, text)
+
+    def _send(self, key: tuple, chat_id: int, reason: str, text: str, delete_after: float, now: float):
+        warning = self._warnings[key] = _Warning(text, now + max(self.window, delete_after), now + delete_after)
+        WARNINGS.inc(reason, 'sent')
+        future = self.outbound.send_message(chat_id, text)
+
+        def on_sent(done: asyncio.Future):
+            message = done.result()
+            if message is None:
+                # Не отправилось (истекло в очереди или ошибка) — следующее нарушение попробует снова
+                if self._warnings.get(key) is warning:
+                    del self._warnings[key]
+                return
+            warning.message_id = message.message_id
+            delay = max(0.0, warning.visible_until - time.monotonic())
+            self.outbound.deletions.schedule(chat_id, message.message_id, delay)
+
+        future.add_done_callback(on_sent)
+
+    def _sweep(self, now: float):
+        if now - self._swept_at < self.window:
+            return
+        self._swept_at = now
+        expired = [key for key, warning in self._warnings.items()
+                   if now >= warning.active_until and warning.message_id is not None]
+        for key in expired:
+            del self._warnings[key]
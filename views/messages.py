@@ -1,3 +1,6 @@
+from datetime import datetime
+
+
 class Messages:
     @staticmethod
     def subscription_required(user_name: str, channels: list) -> str:
@@ -21,6 +24,13 @@ class Messages:
 /remove_global_word слово - удалить глобальное стоп-слово
 /add_group_word слово - добавить стоп-слово для этой группы  
 /remove_group_word слово - удалить стоп-слово для этой группы
+/add_global_regex выражение - добавить глобальное регулярное выражение
+/add_group_regex выражение - добавить регулярное выражение для этой группы
+В словах можно использовать шаблоны: * - до 16 букв, ? - одна буква
+/import_global_words - загрузить глобальные стоп-слова из файла (txt, csv, json)
+/import_group_words - загрузить стоп-слова группы из файла
+/export_global_words - выгрузить глобальные стоп-слова файлом
+/export_group_words - выгрузить стоп-слова группы файлом
 
 👤 Управление пользователями:
 /ban @username - заблокировать пользователя
@@ -29,10 +39,20 @@ class Messages:
 ⚙️ Настройки группы:
 /require_subscription_toggle - вкл/выкл проверку подписки
 /set_slow_mode_delay 60 - установить медл-режим (секунды)
+/set_slow_mode_burst 3 - сколько сообщений подряд разрешено в медл-режиме
+/set_violation_half_life 24 - за сколько часов счёт нарушений уменьшается вдвое (0 - никогда)
+/set_violation_threshold 5 - при каком счёте нарушений удалять все сообщения пользователя
+/raid_on - включить режим рейда
+/raid_off - выключить режим рейда
+/raid_auto - включать режим рейда автоматически
+/raid_status - включён ли сейчас режим рейда
 /add_target_channel @channel - добавить канал для подписки
 /remove_target_channel @channel - удалить канал для подписки
 /target_channel_list - список каналов для подписки
 
+🗄 База данных:
+/db_stats - размер таблиц и результат последнего обслуживания
+
 ℹ️ Справка:
 /admin - показать это сообщение
 /help - показать это сообщение
@@ -43,6 +63,33 @@ class Messages:
         scope = "глобальные" if is_global else "группы"
         return f"✅ Слово '{word}' добавлено в {scope} стоп-слова"
 
+    @staticmethod
+    def invalid_stop_word(error: str) -> str:
+        return f"❌ Стоп-слово не добавлено: {error}"
+
+    @staticmethod
+    def no_document_provided() -> str:
+        return "❌ Приложите к команде файл со словами (txt, csv или json) или ответьте командой на сообщение с файлом"
+
+    @staticmethod
+    def document_too_large(max_size: int) -> str:
+        return f"❌ Файл слишком большой, максимум {max_size // 1024} КБ"
+
+    @staticmethod
+    def stop_words_import_failed(error: str) -> str:
+        return f"❌ Не удалось загрузить стоп-слова: {error}"
+
+    @staticmethod
+    def stop_words_imported(added: int, duplicates: int, rejected: int, is_global: bool = True) -> str:
+        scope = "глобальные" if is_global else "группы"
+        return (f"✅ Загружено в {scope} стоп-слова: {added}\n"
+                f"Уже были в списке: {duplicates}\n"
+                f"Отклонено: {rejected}")
+
+    @staticmethod
+    def stop_words_exported(is_global: bool = True) -> str:
+        return "📋 Глобальные стоп-слова" if is_global else "📋 Стоп-слова этой группы"
+
     @staticmethod
     def stop_word_removed(word: str, is_global: bool = True) -> str:
         scope = "глобальных" if is_global else "группы"
@@ -77,6 +124,58 @@ class Messages:
     def slow_mode_set(delay: int) -> str:
         return f"✅ Медл-режим установлен на {delay} секунд"
 
+    @staticmethod
+    def violation_half_life_set(hours: float) -> str:
+        if not hours:
+            return "✅ Нарушения больше не забываются со временем"
+        return f"✅ Счёт нарушений уменьшается вдвое за {hours:g} ч"
+
+    @staticmethod
+    def violation_threshold_set(threshold: int) -> str:
+        return f"✅ Сообщения удаляются при счёте нарушений от {threshold}"
+
+    @staticmethod
+    def db_stats(stats: dict, report: dict = None) -> str:
+        def size(value) -> str:
+            return f"{value / 1024 / 1024:.1f} МБ" if value is not None else "?"
+
+        lines = [
+            "🗄 База данных:",
+            f"Файл: {size(stats['page_count'] * stats['page_size'])}, "
+            f"свободно страниц: {stats['freelist_count']}",
+            "",
+        ]
+        for table, info in stats['tables'].items():
+            lines.append(f"• {table}: {info['rows']} строк, {size(info['bytes'])}")
+
+        if report:
+            finished = datetime.fromtimestamp(report['finished_at']).strftime('%d.%m.%Y %H:%M')
+            pruned = ", ".join(f"{table} {count}" for table, count in report['pruned'].items()) or "нет"
+            lines += [
+                "",
+                f"🧹 Последнее обслуживание: {finished}, {report['duration']:.1f} сек",
+                f"Удалено строк: {pruned}",
+                f"Возвращено страниц: {report['reclaimed_pages']}",
+            ]
+        else:
+            lines += ["", "🧹 Обслуживание ещё не выполнялось"]
+        return "\n".join(lines)
+
+    @staticmethod
+    def slow_mode_burst_set(burst: int) -> str:
+        return f"✅ В медл-режиме разрешено {burst} сообщений(я) подряд"
+
+    @staticmethod
+    def raid_mode_set(active) -> str:
+        if active is None:
+            return "🤖 Режим рейда будет включаться автоматически"
+        status = "включен" if active else "выключен"
+        return f"🚨 Режим рейда {status}"
+
+    @staticmethod
+    def raid_status(active: bool) -> str:
+        return "🚨 Режим рейда сейчас включен" if active else "✅ Режим рейда сейчас выключен"
+
     @staticmethod
     def slow_mode_warning(remaining_time: int) -> str:
         return f"⏳ Медленный режим! Подождите еще {remaining_time} секунд(у) перед отправкой следующего сообщения."
@@ -109,7 +208,7 @@ class Messages:
         if not words:
             return "📭 Глобальные стоп-слова не настроены"
 
-        words_text = "\n".join([f"• {word.word}" for word in words])
+        words_text = "\n".join([f"• {word.original or word.word}" + (f" ({word.kind})" if word.kind != "word" else "") for word in words])
         return f"📋 Глобальные стоп-слова:\n{words_text}"
 
     @staticmethod
@@ -117,5 +216,5 @@ class Messages:
         if not words:
             return "📭 Стоп-слова для этой группы не настроены"
 
-        words_text = "\n".join([f"• {word.word}" for word in words])
+        words_text = "\n".join([f"• {word.original or word.word}" + (f" ({word.kind})" if word.kind != "word" else "") for word in words])
         return f"📋 Стоп-слова этой группы:\n{words_text}"
\ No newline at end of file